@@ -2,19 +2,36 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import os
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for,jsonify
+import sys
+import click
+from flask import Flask, render_template, request, Response, flash, redirect, url_for,jsonify, stream_with_context, g
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from jinja2 import FileSystemBytecodeCache
 from flask_migrate import Migrate
-from logging import Formatter, FileHandler
-import logging
 from forms import *
-from config import SQLALCHEMY_DATABASE_URI
+from engine import TunedSQLAlchemy
+from routing import Replicas
+from green import concurrently
+from pagination import keyset_page
+from search import NameSearch, FacetSearch
+from counters import ShowCounters
+from queryplans import check_plans
+from cache import PageCache, make_backend, conditional
+from importer import Importer, read_rows
+from exporter import Exporter, formats as export_formats
+from deletes import CascadeDelete, archive_table
+from dates import Localization
+from instrumentation import Instrumentation
+from logs import AppLogging
+from metrics import Metrics
 import pytz
 import datetime
+try:
+  import orjson
+except ImportError:
+  orjson = None
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -22,39 +39,58 @@ import datetime
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')  
-db = SQLAlchemy(app)
-
+app.config.from_object('config.' + app.config['PROFILE'].capitalize())
+if not app.config['SECRET_KEY']:
+  raise RuntimeError('SECRET_KEY must be set in the environment for the {} profile'.format(app.config['PROFILE']))
+if app.config['JINJA_BYTECODE_CACHE_DIR']:
+  os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+  app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR']))
+
+# JSON logs to LOG_FILE, written off the request thread, see logs.py
+app_logging = AppLogging(app)
+# statements, database and render time of every request, see instrumentation.py
+instrumentation = Instrumentation(app)
+# latency, pool, cache and submission metrics at /metrics, see metrics.py
+metrics = Metrics(app)
 # TODO: connect to a local postgresql database [Done]
-app.config['SQLALCHEMY_DATABASE_URI'] =  SQLALCHEMY_DATABASE_URI
-app.config['WHOOSH_BASE'] = 'whoosh/base'
+# pool and timeouts come from the DB_* settings, see engine.py
+db = TunedSQLAlchemy(app)
+# read only views marked @replicas.reads query the replicas, see routing.py
+replicas = Replicas(app, db)
 migrate = Migrate(app, db)
+# locale and time zone of each request, used by the `datetime` filter
+localization = Localization(app)
 
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+def utcnow():
+  return datetime.datetime.now(tz=pytz.UTC)
+
 
 
 class VenueGenre(db.Model):
     __tablename__ = 'venue_genre'
-    __table_args__ = (db.UniqueConstraint('name','venue'),)
+    __table_args__ = (db.UniqueConstraint('name','venue'),
+      db.Index('ix_venue_genre_venue', 'venue'),)
   
     id = db.Column(db.Integer, primary_key = True, )
     name = db.Column(db.String(50),nullable = False)
-    venue = db.Column(db.Integer, db.ForeignKey('venue.id'))
+    venue = db.Column(db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'))
     
     def __repr__(self):
       return '<id: {}, name: {},venue: {},>'.format( self.id, self.name, self.venue)
   
 class ArtistGenre(db.Model):
     __tablename__ = 'artist_genre'
-    __table_args__ = (db.UniqueConstraint('name','artist'),)
-    __searchable__ = ['name']
+    __table_args__ = (db.UniqueConstraint('name','artist'),
+      db.Index('ix_artist_genre_artist', 'artist'),)
 
     id = db.Column(db.Integer, primary_key = True, )
     name = db.Column(db.String(50),nullable = False)
-    artist = db.Column(db.Integer, db.ForeignKey('artist.id'))
+    artist = db.Column(db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'))
    
 
     def __repr__(self):
@@ -62,7 +98,9 @@ class ArtistGenre(db.Model):
   
 class Venue(db.Model):
     __tablename__ = 'venue'
-    __table_args__ = (db.UniqueConstraint('name','city','state','address'),)
+    __table_args__ = (db.UniqueConstraint('name','city','state','address'),
+      db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+      db.Index('ix_venue_name_id', 'name', 'id'),)
 
 
     id = db.Column(db.Integer, primary_key=True)
@@ -80,8 +118,16 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, nullable = False , default = False)
     seeking_description = db.Column(db.String(1200), nullable = True )
 
-    shows = db.relationship('Show', backref = 'venue')
-    genres = db.relationship('VenueGenre', backref='venues')
+    # maintained by ShowCounters, exact as of ShowCounterState.rolled_over_at
+    upcoming_shows_count = db.Column(db.Integer, nullable = False, default = 0, server_default = '0')
+    past_shows_count = db.Column(db.Integer, nullable = False, default = 0, server_default = '0')
+
+    # version stamp for ETag / Last-Modified
+    updated_at = db.Column(db.DateTime(timezone=True), nullable = False, default = utcnow, onupdate = utcnow, server_default = db.func.now())
+
+    # shows and genres are deleted with the venue by the database
+    shows = db.relationship('Show', backref = 'venue', passive_deletes = True)
+    genres = db.relationship('VenueGenre', backref='venues', passive_deletes = True)
 
     def __repr__(self):
       return '<id: {}, name: {}, city: {}, state: {}, address: {},genres: {}, phone: {}, image: {}, facebook: {}, website: {}, seeking_talent: {}, seeking_description: {}>'.format( self.id, self.name, self.city, self.state, self.address, self.genres, self.phone, self.image_link, self.facebook_link, self.website_link, self.seeking_talent, self.seeking_description)
@@ -89,7 +135,9 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'artist'
-    __table_args__ = (db.UniqueConstraint('name','city','state','phone'),)
+    __table_args__ = (db.UniqueConstraint('name','city','state','phone'),
+      db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+      db.Index('ix_artist_name_id', 'name', 'id'),)
 
 
     id = db.Column(db.Integer, primary_key=True)
@@ -104,45 +152,395 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120), nullable = True)
     seeking_venues = db.Column(db.Boolean(), nullable = False, default= False)
     seeking_description = db.Column(db.String(120), nullable = True)
-    
+
+    # maintained by ShowCounters, exact as of ShowCounterState.rolled_over_at
+    upcoming_shows_count = db.Column(db.Integer, nullable = False, default = 0, server_default = '0')
+    past_shows_count = db.Column(db.Integer, nullable = False, default = 0, server_default = '0')
+
+    # version stamp for ETag / Last-Modified
+    updated_at = db.Column(db.DateTime(timezone=True), nullable = False, default = utcnow, onupdate = utcnow, server_default = db.func.now())
 
     # on to many relationship with show (artist is parent table) 
-    shows = db.relationship('Show', backref = 'artist')
-    genres = db.relationship('ArtistGenre', backref = 'artists')
+    shows = db.relationship('Show', backref = 'artist', passive_deletes = True)
+    genres = db.relationship('ArtistGenre', backref = 'artists', passive_deletes = True)
 
     def __repr__(self):
       return '<id: {}, name: {}, city: {}, state: {}, genres: {}, phone: {}, image: {}, facebook: {}, website: {}, seeking_venues: {}, seeking_description: {}>'.format( self.id, self.name, self.city, self.state,
       self.genres,self.phone, self.image_link, self.facebook_link, self.website_link, self.seeking_venues, self.seeking_description)
      
        
+# the city (and state) filter of the faceted search, see FacetSearch
+db.Index('ix_venue_lower_city_state', db.func.lower(Venue.city), Venue.state)
+db.Index('ix_artist_lower_city_state', db.func.lower(Artist.city), Artist.state)
+
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration. [done]
 
 class Show(db.Model):
     __tablename__ = 'show'
-    __table_args__ = (db.UniqueConstraint('artist_id', 'date'),)
+    # the unique (artist_id, date) also serves an artist's shows by date
+    __table_args__ = (db.UniqueConstraint('artist_id', 'date'),
+      db.Index('ix_show_venue_id_date', 'venue_id', 'date'),
+      db.Index('ix_show_date_id', 'date', 'id'),)
 
     id = db.Column(db.Integer, primary_key = True)
     date = db.Column(db.DateTime(timezone=True), default = datetime.datetime.utcnow, nullable=False)
-    artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'))
-    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'))
+    artist_id = db.Column(db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'))
+    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'))
+
+    # version stamp for ETag / Last-Modified
+    updated_at = db.Column(db.DateTime(timezone=True), nullable = False, default = utcnow, onupdate = utcnow, server_default = db.func.now())
 
     def __repr__(self):
       return '<id: {}, date: {}, artist_id: {}, venue_id: {}>'.format( self.id, self.date, self.artist_id, self.venue_id,)
+
+@db.event.listens_for(db.session, 'after_flush')
+def touch_owners(session, flush_context):
+  # genres are part of their venue or artist page, changing them is a new version
+  # so is a show leaving a page (deleted, or moved to another venue or artist):
+  # the newest stamp left on the page could be older, Last-Modified would go back
+  # owners inserted or updated by the same flush already got a fresh stamp
+  changed = list(session.new) + list(session.deleted)
+  stamped = set(session.new) | set(o for o in session.dirty if session.is_modified(o, include_collections=False))
+  venues = set(g.venue for g in changed if isinstance(g, VenueGenre))
+  artists = set(g.artist for g in changed if isinstance(g, ArtistGenre))
+  for show in session.deleted:
+    if isinstance(show, Show):
+      venues.add(show.venue_id)
+      artists.add(show.artist_id)
+  for show in session.dirty:
+    if isinstance(show, Show):
+      venues.update(db.inspect(show).attrs.venue_id.history.deleted)
+      artists.update(db.inspect(show).attrs.artist_id.history.deleted)
+  venues -= set([None]) | set(v.id for v in stamped if isinstance(v, Venue))
+  artists -= set([None]) | set(a.id for a in stamped if isinstance(a, Artist))
+  if venues:
+    session.execute(Venue.__table__.update().where(Venue.id.in_(venues)).values(updated_at=utcnow()))
+  if artists:
+    session.execute(Artist.__table__.update().where(Artist.id.in_(artists)).values(updated_at=utcnow()))
+
+class ShowCounterState(db.Model):
+    __tablename__ = 'show_counter_state'
+
+    # single row, the moment the show counters were last rolled over
+    id = db.Column(db.Integer, primary_key = True)
+    rolled_over_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+      return '<id: {}, rolled_over_at: {}>'.format( self.id, self.rolled_over_at)
+
+@db.event.listens_for(ShowCounterState.__table__, 'after_create')
+def create_show_counter_state(target, connection, **kw):
+    # a fresh database has no shows, so every counter is exact as of now
+    connection.execute(target.insert().values(id=1, rolled_over_at=datetime.datetime.now(tz=pytz.UTC)))
+
+# deleted venues and artists with their shows and genres, when ARCHIVE_DELETES is on
+archives = dict((table.name, archive_table(db.metadata, table)) for table in
+  (Venue.__table__, Artist.__table__, Show.__table__, VenueGenre.__table__, ArtistGenre.__table__))
+
+# the trigram indexes on venue and artist names need pg_trgm
+db.event.listen(db.metadata, 'before_create', db.DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+show_counters = ShowCounters(db, Show, ShowCounterState, {Venue: Show.venue_id, Artist: Show.artist_id})
+
+venue_search = NameSearch(db, Venue, show_counters)
+artist_search = NameSearch(db, Artist, show_counters)
+facet_search = {
+  'venues': FacetSearch(db, Venue, VenueGenre, VenueGenre.venue, show_counters),
+  'artists': FacetSearch(db, Artist, ArtistGenre, ArtistGenre.artist, show_counters),
+}
+
+def changed(obj, *columns):
+  # whether the flush changed any of these columns of obj
+  state = db.inspect(obj)
+  return any(state.attrs[column].history.has_changes() for column in columns)
+
+def page_tags(obj, created):
+  # the cached pages a change to obj makes stale, see PageCache
+  # a listing also goes stale when a column it shows or sorts by changes,
+  # the row may move to another page of it
+  if isinstance(obj, Venue):
+    return ['venue:{}'.format(obj.id)] + (['venues'] if created or changed(obj, 'name', 'city', 'state') else []) \
+      + (['shows'] if not created and changed(obj, 'name') else [])
+  if isinstance(obj, Artist):
+    return ['artist:{}'.format(obj.id)] + (['artists'] if created or changed(obj, 'name') else []) \
+      + (['shows'] if not created and changed(obj, 'name', 'image_link') else [])
+  if isinstance(obj, Show):
+    return ['shows', 'venue:{}'.format(obj.venue_id), 'artist:{}'.format(obj.artist_id)]
+  if isinstance(obj, VenueGenre):
+    return ['venue:{}'.format(obj.venue)]
+  if isinstance(obj, ArtistGenre):
+    return ['artist:{}'.format(obj.artist)]
+  return []
+
+page_cache = PageCache(make_backend(app.config), db, page_tags, app.config['PAGE_CACHE_TIMEOUT'],
+  localization.variant, metrics.cache_lookup, replicas.staleness)
+
+# cascading deletes are core statements, the ORM events never see them
+# (the counter updates of the other side also give it a new updated_at).
+# The rows going keep their counters, as they are archived
+
+def venues_deleting(ids):
+  artists = [row[0] for row in db.session.query(Show.artist_id).filter(Show.venue_id.in_(ids)).distinct()]
+  show_counters.shows_removed(db.session.query(Show.id).filter(Show.venue_id.in_(ids)), [Artist])
+  venue_search.invalidate()
+  page_cache.mark('venues', 'shows', *['venue:{}'.format(id) for id in ids] + ['artist:{}'.format(id) for id in artists])
+
+def artists_deleting(ids):
+  venues = [row[0] for row in db.session.query(Show.venue_id).filter(Show.artist_id.in_(ids)).distinct()]
+  show_counters.shows_removed(db.session.query(Show.id).filter(Show.artist_id.in_(ids)), [Venue])
+  artist_search.invalidate()
+  page_cache.mark('artists', 'shows', *['artist:{}'.format(id) for id in ids] + ['venue:{}'.format(id) for id in venues])
+
+venue_deletes = CascadeDelete(db, Venue, [(Show, Show.venue_id), (VenueGenre, VenueGenre.venue)], archives, venues_deleting)
+artist_deletes = CascadeDelete(db, Artist, [(Show, Show.artist_id), (ArtistGenre, ArtistGenre.artist)], archives, artists_deleting)
   
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+# `datetime` is registered by Localization above, see dates.py
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def page_args():
+  # cursor and page size of a listing request, the page size is capped by the config
+  per_page = request.args.get('per_page', app.config['PAGE_SIZE'], type=int)
+  per_page = max(1, min(per_page, app.config['MAX_PAGE_SIZE']))
+  return request.args.get('after'), request.args.get('before'), per_page
+
+def page_links(prev_cursor, next_cursor, per_page):
+  # the other arguments of the request (e.g. fields) carry over to the next page
+  args = dict((k, v) for k, v in request.args.items() if k not in ('after', 'before', 'per_page'))
+  args.update(request.view_args or {})
+  return {
+    "prev": url_for(request.endpoint, before=prev_cursor, per_page=per_page, **args) if prev_cursor else None,
+    "next": url_for(request.endpoint, after=next_cursor, per_page=per_page, **args) if next_cursor else None,
+  }
+
+def split_shows(rows, keys):
+  # rows are (other side id, name, image link, date, is upcoming, is past)
+  # all split at the same `now`, so a show can never be counted twice
+  upcoming_shows = []
+  past_shows = []
+  for row in rows:
+    show = {
+      keys[0]: row[0],
+      keys[1]: row[1],
+      keys[2]: row[2],
+      "start_time": row[3]
+    }
+    if row[4]:
+      upcoming_shows.append(show)
+    elif row[5]:
+      past_shows.append(show)
+  return upcoming_shows, past_shows
+
+def sync_genres(owner, names, genre_model):
+  # makes owner.genres match names, inserting and deleting only the genres that changed
+  wanted = set(names)
+  for genre in owner.genres:
+    if genre.name in wanted:
+      wanted.discard(genre.name)
+    else:
+      db.session.delete(genre)
+  for name in sorted(wanted):
+    owner.genres.append(genre_model(name=name))
+
+def load_venue_detail(venue_id):
+  # builds the show_venue data in two statements, run concurrently under gevent:
+  # the venue with its genres, and its shows joined to their artists
+  now = datetime.datetime.now(tz=pytz.UTC)
+  venue, rows = concurrently(db,
+    lambda: Venue.query.options(db.joinedload(Venue.genres)).filter(Venue.id == venue_id).first(),
+    lambda: db.session.query(
+      Artist.id, Artist.name, Artist.image_link, Show.date, Show.date > now, Show.date < now
+    ).join(Artist, Artist.id == Show.artist_id).filter(Show.venue_id == venue_id).order_by(Show.date).all())
+  if venue is None:
+    return {}
+  upcoming_shows, past_shows = split_shows(rows, ("artist_id", "artist_name", "artist_image_link"))
+
+  return {
+      "id": venue.id,
+      "name": venue.name,
+      "genres": [genre.name for genre in venue.genres],
+      "address": venue.address,
+      "city": venue.city,
+      "state": venue.state,
+      "phone": venue.phone,
+      "website": venue.website_link,
+      "facebook_link": venue.facebook_link,
+      "seeking_talent": venue.seeking_talent,
+      "seeking_description": venue.seeking_description,
+      "image_link": venue.image_link,
+      "past_shows": past_shows,
+      "upcoming_shows": upcoming_shows,
+      "past_shows_count": len(past_shows),
+      "upcoming_shows_count": len(upcoming_shows),
+  }
+
+def load_artist_detail(artist_id):
+  # builds the show_artist data in two statements, run concurrently under gevent:
+  # the artist with its genres, and its shows joined to their venues
+  now = datetime.datetime.now(tz=pytz.UTC)
+  artist, rows = concurrently(db,
+    lambda: Artist.query.options(db.joinedload(Artist.genres)).filter(Artist.id == artist_id).first(),
+    lambda: db.session.query(
+      Venue.id, Venue.name, Venue.image_link, Show.date, Show.date > now, Show.date < now
+    ).join(Venue, Venue.id == Show.venue_id).filter(Show.artist_id == artist_id).order_by(Show.date).all())
+  if artist is None:
+    return {}
+  upcoming_shows, past_shows = split_shows(rows, ("venue_id", "venue_name", "venue_image_link"))
+
+  return {
+      "id": artist.id,
+      "name": artist.name,
+      "genres": [genre.name for genre in artist.genres],
+      "city": artist.city,
+      "state": artist.state,
+      "phone": artist.phone,
+      "website": artist.website_link,
+      "facebook_link": artist.facebook_link,
+      "seeking_venue": artist.seeking_venues,
+      "seeking_description": artist.seeking_description,
+      "image_link": artist.image_link,
+      "past_shows": past_shows,
+      "upcoming_shows": upcoming_shows,
+      "past_shows_count": len(past_shows),
+      "upcoming_shows_count": len(upcoming_shows),
+  }
 
-app.jinja_env.filters['datetime'] = format_datetime
+def load_venues_page():
+  # one page of venues grouped by area, as (areas, page links)
+  data = []
+  after, before, per_page = page_args()
+  # upcoming show count per venue, from the maintained counters
+  upcoming = show_counters.upcoming(Venue, datetime.datetime.now(tz=pytz.UTC))
+
+  # one page of venues with their upcoming show count in a single statement
+  query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, upcoming)
+  venues, prev_cursor, next_cursor = keyset_page(query, [Venue.name, Venue.id], lambda v: (v[1], v[0]),
+    after=after, before=before, per_page=per_page)
+  page = page_links(prev_cursor, next_cursor, per_page)
+  page_cache.tag('venues', *['venue:{}'.format(v[0]) for v in venues])
+
+  # group the venues of the page by area
+  areas = {}
+  for v in sorted(venues, key=lambda v: (v[3], v[2])):
+    key = (v[2], v[3])
+    if key not in areas:
+      areas[key] = {
+        "city": v[2],
+        "state": v[3],
+        "venues": []
+        }
+      data.append(areas[key])
+    areas[key]['venues'].append({
+        "id": v[0],
+        "name": v[1],
+        "num_upcoming_shows": v[4],
+      })
+  return data, page
+
+def load_artists_page():
+  # one page of artists, as (artists, page links)
+  data = []
+  after, before, per_page = page_args()
+  query = db.session.query(Artist.id,Artist.name)
+  arists, prev_cursor, next_cursor = keyset_page(query, [Artist.name, Artist.id], lambda a: (a[1], a[0]),
+    after=after, before=before, per_page=per_page)
+  page = page_links(prev_cursor, next_cursor, per_page)
+  page_cache.tag('artists', *['artist:{}'.format(a[0]) for a in arists])
+  for artist in arists:
+    new_artist = {
+      "id": artist[0],
+      "name": artist[1]
+    }
+    data.append(new_artist)
+  return data, page
+
+def shows_rows():
+  # the requested page of shows with their venue and artist, and the version
+  # stamps of all three. shows_stamp and the page share it, a miss runs it once
+  if 'shows_page' not in g:
+    after, before, per_page = page_args()
+    query = db.session.query(
+      Show.id, Show.date, Venue.id, Venue.name, Artist.id, Artist.name, Artist.image_link,
+      Show.updated_at, Venue.updated_at, Artist.updated_at
+    ).join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id)
+    g.shows_page = keyset_page(query, [Show.date, Show.id], lambda s: (s[1], s[0]),
+      after=after, before=before, per_page=per_page)
+  return g.shows_page
+
+def load_shows_page():
+  # one page of shows with their venue and artist, as (shows, page links)
+  data = []
+  after, before, per_page = page_args()
+  shows, prev_cursor, next_cursor = shows_rows()
+  page = page_links(prev_cursor, next_cursor, per_page)
+  page_cache.tag('shows', *['venue:{}'.format(s[2]) for s in shows] + ['artist:{}'.format(s[4]) for s in shows])
+  for show in shows:
+    new_show = {
+    "venue_id": show[2],
+    "venue_name": show[3],
+    "artist_id": show[4],
+    "artist_name": show[5],
+    "artist_image_link": show[6],
+    "start_time": show[1]
+    }
+    data.append(new_show)
+  return data, page
+
+def latest(*stamps):
+  stamps = [stamp for stamp in stamps if stamp is not None]
+  return max(stamps) if stamps else None
+
+def venue_stamp(venue_id):
+  # one aggregate over the venue, its shows and their artists, see conditional()
+  # the past/upcoming counts change the page as time passes
+  try:
+    now = utcnow()
+    row = db.session.query(
+      Venue.updated_at, db.func.max(Show.updated_at), db.func.max(Artist.updated_at), db.func.count(Show.id),
+      db.func.sum(db.case([(Show.date < now, 1)], else_=0)), db.func.sum(db.case([(Show.date > now, 1)], else_=0)),
+      db.func.max(db.case([(Show.date < now, Show.date)]))
+    ).select_from(Venue).outerjoin(Show, Show.venue_id == Venue.id).outerjoin(Artist, Artist.id == Show.artist_id) \
+      .filter(Venue.id == venue_id).group_by(Venue.id, Venue.updated_at).first()
+  except:
+    db.session.rollback()
+    return None
+  if row is None:
+    return None
+  return tuple(row), latest(row[0], row[1], row[2], row[6])
+
+def artist_stamp(artist_id):
+  try:
+    now = utcnow()
+    row = db.session.query(
+      Artist.updated_at, db.func.max(Show.updated_at), db.func.max(Venue.updated_at), db.func.count(Show.id),
+      db.func.sum(db.case([(Show.date < now, 1)], else_=0)), db.func.sum(db.case([(Show.date > now, 1)], else_=0)),
+      db.func.max(db.case([(Show.date < now, Show.date)]))
+    ).select_from(Artist).outerjoin(Show, Show.artist_id == Artist.id).outerjoin(Venue, Venue.id == Show.venue_id) \
+      .filter(Artist.id == artist_id).group_by(Artist.id, Artist.updated_at).first()
+  except:
+    db.session.rollback()
+    return None
+  if row is None:
+    return None
+  return tuple(row), latest(row[0], row[1], row[2], row[6])
+
+def shows_stamp():
+  # the version stamps of exactly the rows the requested page shows
+  try:
+    rows, prev_cursor, next_cursor = shows_rows()
+  except:
+    db.session.rollback()
+    return None
+  if not rows:
+    return None
+  return (tuple(tuple(row) for row in rows), prev_cursor, next_cursor), latest(*[stamp for row in rows for stamp in row[7:]])
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -157,39 +555,22 @@ def index():
 #----------------------------------------------------------------------------#
 
 @app.route('/venues')
+@replicas.reads
+@page_cache.cached
 def venues():
   # TODO: replace with real venues data. [done]
   # num_shows should be aggregated based on number of upcoming shows per venue.
   data= []
-  try:   
-    # returns all the unique areas in the db
-    areas = db.session.query(Venue.city,Venue.state).group_by(Venue.state,Venue.city).all()
-    for a in areas:
-      area = {
-          "city": a[0],
-          "state": a[1],
-          "venues": []
-          }
-      # returns all the venues for each unique area in the db
-      venues = Venue.query.filter(Venue.state == a[1], Venue.city == a[0]).all()
-      
-      #create a venue dictionary for each venue in the area
-      for v in venues:
-        venue_in_the_area = {
-            "id": v.id,
-            "name": v.name,
-            "num_upcoming_shows": Show.query.filter(Show.date > datetime.datetime.now(tz=pytz.UTC), Show.venue_id == v.id).count(),
-          }
-        area['venues'].append(venue_in_the_area)
-
-      # add the area to the data
-      data.append(area)
+  page = {}
+  try:
+    data, page = load_venues_page()
   except:
     db.session.rollback()
+    app.logger.exception('page error on %s', request.path)
   finally:
     db.session.close()
     if data:
-      return render_template('pages/venues.html', areas=data)
+      return render_template('pages/venues.html', areas=data, page=page)
     else:
       return render_template('errors/404.html')     
 
@@ -219,85 +600,30 @@ def venues():
   
 
 @app.route('/venues/search', methods=['POST'])
+@replicas.reads
 def search_venues():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.[done]
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  word ='%{}%'.format(request.form["search_term"])
-  results = Venue.query.filter(Venue.name.ilike(word)).all()
-  response = {
-    "count": len(results),
-    "data": []
-  }
-
-  for r in results:
-    result = {
-      "id": r.id,
-      "name": r.name,
-      "num_upcoming_shows": Show.query.filter(Show.date > datetime.datetime.now(tz=pytz.UTC), Show.venue_id == r.id).count(),
-    }
-    response["data"].append(result)
+  response = venue_search.search(request.form["search_term"], datetime.datetime.now(tz=pytz.UTC))
 
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/venues/<int:venue_id>')
+@replicas.reads
+@conditional(venue_stamp, app.config['ETAG_SALT'], localization.variant)
+@page_cache.cached
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id [done]
   data = {}
   try:
-    venue = Venue.query.get(venue_id)
-    genres = []
-    
-    # return all genres of the venue in a list
-    for genre in venue.genres:
-      genres.append(genre.name)
-    
-    # get upcoming shows
-    all_upcoming_shows = Show.query.filter(Show.date > datetime.datetime.now(tz=pytz.UTC), Show.venue_id == venue.id).all()
-    upcoming_shows=[]
-    for i in range(len(all_upcoming_shows)):
-      show = {
-        "artist_id": venue.shows[i].artist_id,
-        "artist_name": venue.shows[i].artist.name,
-        "artist_image_link":venue.shows[i].artist.image_link,
-        "start_time": venue.shows[i].date.strftime('%Y-%m-%d %H:%M:%S')
-      }
-      upcoming_shows.append(show)
-      
-    # get past shows
-    all_past_shows = Show.query.filter(Show.date < datetime.datetime.now(tz=pytz.UTC), Show.venue_id == venue.id).all()
-    past_shows=[]
-    for i in range(len(all_past_shows)):
-      show = {
-        "artist_id": venue.shows[i].artist_id,
-        "artist_name": venue.shows[i].artist.name,
-        "artist_image_link":venue.shows[i].artist.image_link,
-        "start_time": venue.shows[i].date.strftime('%Y-%m-%d %H:%M:%S')
-      }
-      past_shows.append(show)
-  
-    # format the data
-    data = {
-        "id": venue.id,
-        "name": venue.name,
-        "genres": genres,
-        "address": venue.address,
-        "city": venue.city,
-        "state": venue.state,
-        "phone": venue.phone,
-        "website": venue.website_link,
-        "facebook_link": venue.facebook_link,
-        "seeking_talent": venue.seeking_talent,
-        "seeking_description": venue.seeking_description,
-        "image_link": venue.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": Show.query.filter(Show.date < datetime.datetime.now(tz=pytz.UTC), Show.venue_id == venue.id).count(),
-        "upcoming_shows_count": Show.query.filter(Show.date > datetime.datetime.now(tz=pytz.UTC), Show.venue_id == venue.id).count(),
-    }
+    data = load_venue_detail(venue_id)
+    if data:
+      page_cache.tag('venue:{}'.format(venue_id), *['artist:{}'.format(show['artist_id']) for show in data['upcoming_shows'] + data['past_shows']])
   except:
     db.session.rollback()
+    app.logger.exception('page error on %s', request.path)
   finally:
     db.session.close()
     if data:
@@ -389,6 +715,40 @@ def show_venue(venue_id):
 
    
 
+#  Search
+#  ----------------------------------------------------------------
+
+@app.route('/search')
+@replicas.reads
+def search():
+  # combined search over venues or artists by name, genre, city and state
+  # e.g. /search?type=venues&genre=Jazz&state=NY
+  kind = request.args.get('type', 'venues')
+  if kind not in facet_search:
+    kind = 'venues'
+  criteria = {
+    "term": request.args.get('q', ''),
+    "genres": request.args.getlist('genre'),
+    "city": request.args.get('city', ''),
+    "state": request.args.get('state', ''),
+  }
+  results = {"count": 0, "data": [], "genres": [], "states": []}
+  try:
+    results = facet_search[kind].search(datetime.datetime.now(tz=pytz.UTC), limit=app.config['PAGE_SIZE'], **criteria)
+  except:
+    db.session.rollback()
+  finally:
+    db.session.close()
+
+  # every facet links to the same search narrowed down to it
+  args = {"type": kind, "q": criteria["term"], "city": criteria["city"], "state": criteria["state"], "genre": criteria["genres"]}
+  for genre in results["genres"]:
+    genre["url"] = url_for('search', **dict(args, genre=[genre["name"]]))
+  for state in results["states"]:
+    state["url"] = url_for('search', **dict(args, state=state["name"]))
+
+  return render_template('pages/search.html', results=results, kind=kind, criteria=criteria)
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -432,21 +792,19 @@ def create_venue_submission(venue):
     website_link= venue['website_link'],
     seeking_talent= venue['seeking_talent'],
     seeking_description= venue['seeking_description'],)
+    #add genres, inserted after the venue in the same commit
+    sync_genres(new_venue, venue['genres'], VenueGenre)
     db.session.add(new_venue)
     db.session.commit()
-  
-    #add genres
-    for genre in venue['genres']:
-      new_genre = VenueGenre(name=genre,venue=new_venue.id)
-      db.session.add(new_genre)
-      db.session.commit()
+    metrics.submitted('venue', 'create', True)
     # on successful db insert, flash success
     # TODO: modify data to be the data object returned from db insertion
-    flash('Venue ' + new_venue.name + ' was successfully listed!')
+    flash('Venue ' + venue['name'] + ' was successfully listed!')
 
   except :
     # TODO: on unsuccessful db insert, flash an error instead.
     db.session.rollback()
+    metrics.submitted('venue', 'create', False)
     flash('An error occurred. Venue ' + venue['name'] + ' could not be listed.')
     # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
  
@@ -461,14 +819,15 @@ def delete_venue(venue_id):
   
   
   try:
-    VenueGenre.query.filter(VenueGenre.venue==venue_id).delete()
-    Show.query.filter(Show.venue_id==venue_id).delete()
-    Venue.query.filter(Venue.id==venue_id).delete()
+    # its shows and genres go with it, see CascadeDelete
+    venue_deletes.delete([int(venue_id)], archive=app.config['ARCHIVE_DELETES'])
     db.session.commit()
+    metrics.submitted('venue', 'delete', True)
     flash('Venue Deleted!') 
   except:
     flash('An error ocured')
     db.session.rollback()
+    metrics.submitted('venue', 'delete', False)
   # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
   # clicking that button delete it from the db then redirect the user to the homepage
   finally:
@@ -478,23 +837,21 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@replicas.reads
+@page_cache.cached
 def artists():
   # TODO: replace with real data returned from querying the database
+  data = []
+  page = {}
   try:
-    data = []
-    arists = db.session.query(Artist.id,Artist.name).all()
-    for artist in arists:
-      new_artist = {
-        "id": artist[0],
-        "name": artist[1]
-      }
-      data.append(new_artist)
+    data, page = load_artists_page()
   except:
     db.session.rollback()
+    app.logger.exception('page error on %s', request.path)
   finally:
     db.session.close()
     if data:
-      return render_template('pages/artists.html', artists=data)
+      return render_template('pages/artists.html', artists=data, page=page)
     else: 
       return render_template('errors/404.html')
 
@@ -511,23 +868,12 @@ def artists():
   
 
 @app.route('/artists/search', methods=['POST'])
+@replicas.reads
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.[done]
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  word ='%{}%'.format(request.form["search_term"])
-  results = Artist.query.filter(Artist.name.ilike(word)).all()
-  response = {
-    "count": len(results),
-    "data": []
-  }
-  for r in results:
-    result = {
-      "id": r.id,
-      "name": r.name,
-      "num_upcoming_shows": Show.query.filter(Show.date > datetime.datetime.now(tz=pytz.UTC), Show.artist_id == r.id).count(),
-    }
-    response["data"].append(result)
+  response = artist_search.search(request.form["search_term"], datetime.datetime.now(tz=pytz.UTC))
 
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
@@ -544,64 +890,21 @@ def search_artists():
 '''
 
 @app.route('/artists/<int:artist_id>')
+@replicas.reads
+@conditional(artist_stamp, app.config['ETAG_SALT'], localization.variant)
+@page_cache.cached
 def show_artist(artist_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id [done]
   data = []
   try:
-    artist = Artist.query.get(artist_id)
-    genres = []
-    
-    # return all genres in a list
-    for genre in artist.genres:
-      genres.append(genre.name)
-    # return all past and upcoming shows in lists
-    
-    # get upcoming shows
-    all_upcoming_shows = Show.query.filter(Show.date > datetime.datetime.now(tz=pytz.UTC), Show.artist_id == artist.id).all()
-    upcoming_shows=[]
-    for i in range(len(all_upcoming_shows)):
-      show = {
-        "venue_id": artist.shows[i].venue_id,
-        "venue_name": artist.shows[i].venue.name,
-        "venue_image_link":artist.shows[i].venue.image_link,
-        "start_time": artist.shows[i].date.strftime('%Y-%m-%d %H:%M:%S')
-      }
-      upcoming_shows.append(show)
-      
-    # get past shows
-    all_past_shows = Show.query.filter(Show.date < datetime.datetime.now(tz=pytz.UTC), Show.artist_id == artist.id).all()
-    past_shows=[]
-    for i in range(len(all_past_shows)):
-      show = {
-        "venue_id": artist.shows[i].venue_id,
-        "venue_name": artist.shows[i].venue.name,
-        "venue_image_link":artist.shows[i].venue.image_link,
-        "start_time": artist.shows[i].date.strftime('%Y-%m-%d %H:%M:%S')
-      }
-      past_shows.append(show)
-    
-    #format data
-    data = {
-        "id": artist.id,
-        "name": artist.name,
-        "genres": genres,
-        "city": artist.city,
-        "state": artist.state,
-        "phone": artist.phone,
-        "website": artist.website_link,
-        "facebook_link": artist.facebook_link,
-        "seeking_venue": artist.seeking_venues,
-        "seeking_description": artist.seeking_description,
-        "image_link": artist.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": Show.query.filter(Show.date < datetime.datetime.now(tz=pytz.UTC), Show.artist_id == artist.id).count(),
-        "upcoming_shows_count": Show.query.filter(Show.date > datetime.datetime.now(tz=pytz.UTC), Show.artist_id == artist.id).count(),
-    }
+    data = load_artist_detail(artist_id)
+    if data:
+      page_cache.tag('artist:{}'.format(artist_id), *['venue:{}'.format(show['venue_id']) for show in data['upcoming_shows'] + data['past_shows']])
 
   except:
     db.session.rollback()
+    app.logger.exception('page error on %s', request.path)
   finally:
     db.session.close()
     if data:
@@ -686,6 +989,22 @@ def show_artist(artist_id):
     return render_template('pages/show_artist.html', artist=data)
   '''
 
+@app.route('/artists/<int:artist_id>', methods=['POST'])
+def delete_artist(artist_id):
+  try:
+    # its shows and genres go with it, see CascadeDelete
+    artist_deletes.delete([artist_id], archive=app.config['ARCHIVE_DELETES'])
+    db.session.commit()
+    metrics.submitted('artist', 'delete', True)
+    flash('Artist Deleted!')
+  except:
+    flash('An error ocured')
+    db.session.rollback()
+    metrics.submitted('artist', 'delete', False)
+  finally:
+    db.session.close()
+    return redirect(url_for('index'))
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET','POST'])
@@ -772,19 +1091,14 @@ def edit_artist_submission(artist_id,form):
     if artist.image_link != form.image_link.data:
       artist.image_link = form.image_link.data
     
-    # submit new genres 
-    for genre_name in form.genres.data:
-      genre = ArtistGenre.query.filter(ArtistGenre.artist==artist_id).delete()
-      db.session.commit()
-
-    for genre_name in form.genres.data:
-      genre = ArtistGenre(name=genre_name)
-      artist.genres.append(genre)
-    db.session.add(artist)
+    # submit new genres, only the ones that changed
+    sync_genres(artist, form.genres.data, ArtistGenre)
     db.session.commit()
+    metrics.submitted('artist', 'edit', True)
 
   except:
     db.session.rollback()
+    metrics.submitted('artist', 'edit', False)
     flash("An error ocurred, artist couldn't be updated")
   finally:
     db.session.close()
@@ -882,19 +1196,14 @@ def edit_venue_submission(venue_id,form):
     if venue.image_link != form.image_link.data:
       venue.image_link = form.image_link.data
 
-    # submit new genres
-    for genre_name in form.genres.data:
-      genre = VenueGenre.query.filter(VenueGenre.venue==venue_id).delete()
-      db.session.commit()
-
-    for genre_name in form.genres.data:
-      genre = VenueGenre(name=genre_name)
-      venue.genres.append(genre)
-    db.session.add(venue)
+    # submit new genres, only the ones that changed
+    sync_genres(venue, form.genres.data, VenueGenre)
     db.session.commit()
+    metrics.submitted('venue', 'edit', True)
 
   except :
     db.session.rollback()
+    metrics.submitted('venue', 'edit', False)
     flash("An error ocurred, venue couldn't be updated")
   finally:
     db.session.close()
@@ -939,23 +1248,20 @@ def create_artist_submission(artist):
     website_link= artist['website_link'],
     seeking_venues= artist['seeking_venues'],
     seeking_description= artist['seeking_description'],)
+    #add genres, inserted after the artist in the same commit
+    sync_genres(new_artist, artist['genres'], ArtistGenre)
     db.session.add(new_artist)
     db.session.commit()
+    metrics.submitted('artist', 'create', True)
 
-    #add genres
-    if new_artist.id:
-      for genre in artist['genres']:
-        new_genre = ArtistGenre(name=genre,artist=new_artist.id)
-        db.session.add(new_genre)
-        db.session.commit()
-    
     # on successful db insert, flash success
     # TODO: modify data to be the data object returned from db insertion
-    flash('Artist ' + new_artist.name + ' was successfully listed!')
+    flash('Artist ' + artist['name'] + ' was successfully listed!')
 
   except:
     # TODO: on unsuccessful db insert, flash an error instead.
     db.session.rollback()
+    metrics.submitted('artist', 'create', False)
     flash('An error occurred. Venue ' + artist['name'] + ' could not be listed.')
     # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
 
@@ -968,29 +1274,24 @@ def create_artist_submission(artist):
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@replicas.reads
+@conditional(shows_stamp, app.config['ETAG_SALT'], localization.variant)
+@page_cache.cached
 def shows():
   # displays list of shows at /shows
   # TODO: replace with real venues data. [done]
   # num_shows should be aggregated based on number of upcoming shows per venue.
+  data = []
+  page = {}
   try:
-    data = []
-    shows = Show.query.all()
-    for show in shows:
-      new_show = {
-      "venue_id": show.venue_id,
-      "venue_name": show.venue.name,
-      "artist_id": show.artist_id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": show.date.strftime("%Y-%m-%d %H:%M:%S")
-      }
-      data.append(new_show)
+    data, page = load_shows_page()
   except:
     db.session.rollback()
+    app.logger.exception('page error on %s', request.path)
   finally:
     db.session.close()
     if data:
-      return render_template('pages/shows.html', shows=data)
+      return render_template('pages/shows.html', shows=data, page=page)
     else:
       return render_template('errors/404.html')     
   
@@ -1044,7 +1345,7 @@ def create_shows():
       information = {
         'artist' : form.artist_id.data,
         'venue': form.venue_id.data,
-        'date_time' : form.start_time.data.strftime("%Y-%m-%d %H:%M:%S")
+        'date_time' : form.start_time.data
       }
       create_show_submission(information)
 
@@ -1057,11 +1358,15 @@ def create_show_submission(show):
   try:
     add_show = Show(artist_id=show['artist'],venue_id=show['venue'],date=show['date_time'])
     db.session.add(add_show)
+    db.session.flush()
+    show_counters.shows_added([add_show.id])
     db.session.commit()
+    metrics.submitted('show', 'create', True)
     flash('Show was successfully listed!')
   except:  
     # TODO: on unsuccessful db insert, flash an error instead. [done]
     db.session.rollback()
+    metrics.submitted('show', 'create', False)
     flash("An error occurred. Show could not be listed.")
   finally:
     db.session.close()
@@ -1070,6 +1375,214 @@ def create_show_submission(show):
   # e.g., flash('An error occurred. Show could not be listed.
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
 
+#  API
+#  ----------------------------------------------------------------
+#  The same dicts the pages render, as JSON. Listings take the page
+#  arguments (after, before, per_page) and all endpoints take
+#  ?fields=a,b to return only those keys.
+
+def json_value(value):
+  # show times are UTC, written as they always were
+  if isinstance(value, datetime.datetime):
+    if value.tzinfo is not None:
+      value = value.astimezone(pytz.UTC)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+  return str(value)
+
+def json_response(payload, status=200):
+  # orjson is several times faster than json when it is installed
+  if orjson is not None:
+    body = orjson.dumps(payload, default=json_value, option=orjson.OPT_PASSTHROUGH_DATETIME)
+  else:
+    body = json.dumps(payload, separators=(',', ':'), default=json_value)
+  return Response(body, status=status, mimetype='application/json')
+
+def select_fields(item):
+  fields = request.args.get('fields')
+  if not fields:
+    return item
+  wanted = set(fields.split(','))
+  return dict((k, v) for k, v in item.items() if k in wanted)
+
+def api_call(load):
+  try:
+    return load()
+  except:
+    db.session.rollback()
+    app.logger.exception('api error on %s', request.path)
+    return json_response({"error": "internal error"}, 500)
+  finally:
+    db.session.close()
+
+@app.route('/api/v1/venues')
+@replicas.reads
+def api_venues():
+  def load():
+    areas, page = load_venues_page()
+    for area in areas:
+      area['venues'] = [select_fields(venue) for venue in area['venues']]
+    return json_response({"data": areas, "paging": page})
+  return api_call(load)
+
+@app.route('/api/v1/venues/<int:venue_id>')
+@replicas.reads
+def api_venue(venue_id):
+  def load():
+    data = load_venue_detail(venue_id)
+    if not data:
+      return json_response({"error": "venue not found"}, 404)
+    return json_response({"data": select_fields(data)})
+  return api_call(load)
+
+@app.route('/api/v1/artists')
+@replicas.reads
+def api_artists():
+  def load():
+    artists, page = load_artists_page()
+    return json_response({"data": [select_fields(artist) for artist in artists], "paging": page})
+  return api_call(load)
+
+@app.route('/api/v1/artists/<int:artist_id>')
+@replicas.reads
+def api_artist(artist_id):
+  def load():
+    data = load_artist_detail(artist_id)
+    if not data:
+      return json_response({"error": "artist not found"}, 404)
+    return json_response({"data": select_fields(data)})
+  return api_call(load)
+
+@app.route('/api/v1/shows')
+@replicas.reads
+def api_shows():
+  def load():
+    shows, page = load_shows_page()
+    return json_response({"data": [select_fields(show) for show in shows], "paging": page})
+  return api_call(load)
+
+#  Import
+#  ----------------------------------------------------------------
+#  Bulk loads CSV or JSON Lines, validated with the same forms as the
+#  create pages. Columns are the form field names, genres are a list
+#  (JSON) or separated by ';' (CSV).
+
+def venue_values(data):
+  return {
+    'name': data['name'],
+    'city': data['city'],
+    'state': data['state'],
+    'address': data['address'],
+    'phone': data['phone'],
+    'image_link': data['image_link'],
+    'facebook_link': data['facebook_link'],
+    'website_link': data['website_link'],
+    'seeking_talent': data['seeking_talent'],
+    'seeking_description': data['seeking_description'],
+  }
+
+def artist_values(data):
+  return {
+    'name': data['name'],
+    'city': data['city'],
+    'state': data['state'],
+    'phone': data['phone'],
+    'image_link': data['image_link'],
+    'facebook_link': data['facebook_link'],
+    'website_link': data['website_link'],
+    'seeking_venues': data['seeking_venues'],
+    'seeking_description': data['seeking_description'],
+  }
+
+def show_values(data):
+  return {
+    'artist_id': int(data['artist_id']),
+    'venue_id': int(data['venue_id']),
+    'date': data['start_time'],
+  }
+
+# executemany inserts skip the mapper events the search index and the
+# page cache listen to, so the importers tell them
+
+def venues_imported(rows):
+  venue_search.invalidate()
+  page_cache.mark('venues')
+
+def artists_imported(rows):
+  artist_search.invalidate()
+  page_cache.mark('artists')
+
+def shows_imported(rows):
+  venues = set(row['venue_id'] for row in rows)
+  artists = set(row['artist_id'] for row in rows)
+  show_counters.recount({Venue: venues, Artist: artists})
+  page_cache.mark('shows', *['venue:{}'.format(id) for id in venues] + ['artist:{}'.format(id) for id in artists])
+
+importers = {
+  'venues': Importer(db, VenueForm, Venue, venue_values, key=('name', 'city', 'state', 'address'),
+    genre_model=VenueGenre, genre_fk='venue', inserted=venues_imported),
+  'artists': Importer(db, ArtistForm, Artist, artist_values, key=('name', 'city', 'state', 'phone'),
+    genre_model=ArtistGenre, genre_fk='artist', inserted=artists_imported),
+  'shows': Importer(db, ShowForm, Show, show_values,
+    references={'artist_id': Artist, 'venue_id': Venue}, inserted=shows_imported),
+}
+
+@app.route('/import/<kind>', methods=['POST'])
+def import_data(kind):
+  # the body is the file, ?format=csv|jsonl or from the Content-Type
+  if kind not in importers:
+    return json_response({"error": "unknown kind, expected one of " + ", ".join(sorted(importers))}, 404)
+  format = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'jsonl')
+  if format not in ('csv', 'jsonl'):
+    return json_response({"error": "unknown format, expected csv or jsonl"}, 400)
+  try:
+    lines = (line.decode('utf-8') for line in request.stream)
+    report = importers[kind].run(read_rows(lines, format), app.config['IMPORT_BATCH_SIZE'])
+    return json_response(report)
+  except UnicodeDecodeError:
+    db.session.rollback()
+    return json_response({"error": "the file is not utf-8"}, 400)
+  except:
+    db.session.rollback()
+    app.logger.exception('import error on %s', request.path)
+    return json_response({"error": "internal error"}, 500)
+  finally:
+    db.session.close()
+
+#  Export
+#  ----------------------------------------------------------------
+#  Whole tables in id order, streamed. An interrupted export resumes
+#  with ?after_id= the last id it received.
+
+exporters = {
+  'venues': Exporter(db, Venue),
+  'artists': Exporter(db, Artist),
+  'shows': Exporter(db, Show),
+  'venue_genres': Exporter(db, VenueGenre),
+  'artist_genres': Exporter(db, ArtistGenre),
+}
+
+@app.route('/export/<table>')
+@replicas.reads
+def export_data(table):
+  if table not in exporters:
+    return json_response({"error": "unknown table, expected one of " + ", ".join(sorted(exporters))}, 404)
+  format = request.args.get('format', 'csv')
+  if format not in export_formats:
+    return json_response({"error": "unknown format, expected one of " + ", ".join(sorted(export_formats))}, 400)
+  after_id = request.args.get('after_id', type=int)
+
+  def generate():
+    try:
+      for piece in exporters[table].stream(format, after_id):
+        yield piece
+    finally:
+      db.session.close()
+
+  extension = 'jsonl' if format == 'columns' else format
+  return Response(stream_with_context(generate()), mimetype=export_formats[format][1], headers={
+    'Content-Disposition': 'attachment; filename={}.{}'.format(table, extension),
+  })
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -1079,22 +1592,108 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('rollover-shows')
+def rollover_shows():
+  """ Move shows that have started from the upcoming to the past counters, run it from cron """
+  moved = show_counters.rollover(datetime.datetime.now(tz=pytz.UTC))
+  print('{} shows rolled over'.format(moved))
+
+@app.cli.command('check-show-counters')
+@click.option('--repair', is_flag=True, help='Overwrite wrong counters with the live counts.')
+def check_show_counters(repair):
+  """ Compare the stored show counters with live COUNTs """
+  mismatches = show_counters.check(repair=repair)
+  for table, id, column, stored, actual in mismatches:
+    print('{} {}: {} is {}, expected {}'.format(table, id, column, stored, actual))
+  print('{} mismatches{}'.format(len(mismatches), ', repaired' if repair and mismatches else ''))
+  if mismatches and not repair:
+    sys.exit(1)
+
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('file', type=click.File('r', encoding='utf-8'))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, help='Rows per insert and commit.')
+def import_data_command(kind, file, format, batch_size):
+  """ Bulk load venues, artists or shows from a CSV or JSON Lines file """
+  if format is None:
+    format = 'csv' if file.name.endswith('.csv') else 'jsonl'
+  report = importers[kind].run(read_rows(file, format), batch_size or app.config['IMPORT_BATCH_SIZE'])
+  for error in report['errors']:
+    print('line {}: {}'.format(error['line'], '; '.join(
+      '{}: {}'.format(field, ' '.join(messages)) for field, messages in sorted(error['errors'].items()))))
+  print('{} of {} rows imported'.format(report['inserted'], report['rows']))
+  if report['errors']:
+    sys.exit(1)
+
+
+@app.cli.command('export-data')
+@click.argument('table', type=click.Choice(['venues', 'artists', 'shows', 'venue_genres', 'artist_genres']))
+@click.option('--format', default='csv', type=click.Choice(sorted(export_formats)))
+@click.option('--after-id', type=int, help='Only the rows after this id, the last one an interrupted export wrote.')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Defaults to stdout.')
+def export_data_command(table, format, after_id, output):
+  """ Stream a table out as CSV, JSON Lines, column blocks or parquet """
+  for piece in exporters[table].stream(format, after_id):
+    output.write(piece if isinstance(piece, bytes) else piece.encode('utf-8'))
+
+
+@app.cli.command('compile-templates')
+def compile_templates():
+  """ Compile every template into the bytecode cache, run it at build time """
+  names = app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html'))
+  for name in names:
+    app.jinja_env.get_template(name)
+  print('{} templates compiled into {}'.format(len(names), app.config['JINJA_BYTECODE_CACHE_DIR']))
+
+
+def hot_queries(venue, artist):
+  # (name, path, table, index) of the pages to check with check_plans: the
+  # page must reach the table through the index meant for it (any index when None)
+  return [
+    ('venues page', '/venues', 'venue', ('ix_venue_name_id', 'ix_venue_name_trgm')),
+    ('upcoming show counts', '/venues', 'show', 'ix_show_venue_id_date'),
+    ('artists page', '/artists', 'artist', ('ix_artist_name_id', 'ix_artist_name_trgm')),
+    ('shows page', '/shows', 'show', 'ix_show_date_id'),
+    ('venue shows by date', '/venues/{}'.format(venue.id), 'show', 'ix_show_venue_id_date'),
+    ('venue genres', '/venues/{}'.format(venue.id), 'venue_genre', 'ix_venue_genre_venue'),
+    # served by the unique (artist_id, date), its name depends on the database
+    ('artist shows by date', '/artists/{}'.format(artist.id), 'show', None),
+    ('artist genres', '/artists/{}'.format(artist.id), 'artist_genre', 'ix_artist_genre_artist'),
+    ('venues in a city', '/search?type=venues&city={}&state={}'.format(venue.city, venue.state),
+      'venue', 'ix_venue_lower_city_state'),
+    ('artists in a city', '/search?type=artists&city={}'.format(artist.city),
+      'artist', 'ix_artist_lower_city_state'),
+  ]
+
+@app.cli.command('check-query-plans')
+def check_query_plans():
+  """ Fail if a hot page does not reach a table through the index meant for it """
+  venue = Venue.query.first()
+  artist = Artist.query.first()
+  if venue is None or artist is None:
+    sys.exit('the plans are only checked on a database with venues and artists')
+  checks = hot_queries(venue, artist)
+  db.session.remove()
+  failures = check_plans(db.engine, app.test_client(), checks)
+  for name, plan in failures:
+    print('{}: {}'.format(name, ' / '.join(plan)))
+  print('{} of {} hot queries do not use their index'.format(len(failures), len(checks)))
+  if failures:
+    sys.exit(1)
 
 
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
-# specify port manually:
+# development server, debug follows the profile (FYYUR_ENV).
+# in production run gunicorn, see wsgi.py
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=True)
+    app.run(host='0.0.0.0')
 
@@ -0,0 +1,65 @@
+"""
+Compares the sync and the gevent (async) serving paths under the same load.
+
+  python bench/async_bench.py --workers 2 --clients 64 --duration 20
+
+Starts gunicorn once per worker class with the app from the working
+directory (the database from config.py / DATABASE_URL), drives it with
+bench/loadtest.py over HTTP and prints requests/sec and latency side by side.
+The gevent path pays off when requests wait on the database, so run it
+against postgres rather than sqlite.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from loadtest import OverHTTP, PATHS, run
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start on port {}'.format(port))
+
+
+def serve(worker_class, workers, port):
+    env = dict(os.environ, FYYUR_WORKER_CLASS=worker_class, FYYUR_WORKERS=str(workers),
+        FYYUR_BIND='127.0.0.1:{}'.format(port))
+    return subprocess.Popen([sys.executable, '-m', 'gunicorn'], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--clients', type=int, default=64, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--paths', default=','.join(PATHS))
+    args = parser.parse_args()
+
+    for worker_class in ('sync', 'gevent'):
+        print('== {} x {}'.format(worker_class, args.workers))
+        server = serve(worker_class, args.workers, args.port)
+        try:
+            wait_for(args.port)
+            # every worker imports the app and fills its caches before the clock starts
+            target = OverHTTP('http://127.0.0.1:{}'.format(args.port))
+            get = target.client()
+            for path in args.paths.split(',') * args.workers * 2:
+                get(path)
+            run(target, args.clients, args.duration, args.paths.split(','))
+        finally:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,64 @@
+"""
+Formats 100k show times with the `datetime` template filter, the way the
+listing and detail pages do, against plain babel on strftime strings (what
+the filter did before dates.py).
+
+  python bench/dates.py [--count 100000] [--distinct 5000] [--locale fr_FR --tz Europe/Paris]
+
+--distinct is how many different times there are among them, pages show
+the same upcoming shows over and over.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import pytz
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dates
+
+
+def babel_on_strings(values, locale, tz):
+    pattern = dates.named_formats['full']
+    for value in values:
+        babel.dates.format_datetime(dateutil.parser.parse(value.strftime('%Y-%m-%d %H:%M:%S')), pattern,
+            tzinfo=pytz.timezone(tz), locale=locale)
+
+def babel_on_datetimes(values, locale, tz):
+    pattern = dates.named_formats['full']
+    for value in values:
+        babel.dates.format_datetime(value, pattern, tzinfo=pytz.timezone(tz), locale=locale)
+
+def compiled_patterns(values, locale, tz):
+    dates.format_datetime.cache_clear()
+    for value in values:
+        dates.format_datetime(value, 'full', locale, tz)
+
+
+def timed(run, values, locale, tz):
+    started = time.perf_counter()
+    run(values, locale, tz)
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--distinct', type=int, default=5000)
+    parser.add_argument('--locale', default='en_US')
+    parser.add_argument('--tz', default='UTC')
+    args = parser.parse_args()
+
+    start = datetime.datetime(2030, 1, 1, 20, 0, tzinfo=pytz.UTC)
+    times = [start + datetime.timedelta(hours=6 * i) for i in range(args.distinct)]
+    values = [random.choice(times) for i in range(args.count)]
+
+    for name, run in (('babel, strings', babel_on_strings), ('babel, datetimes', babel_on_datetimes),
+                      ('compiled + memoized', compiled_patterns)):
+        seconds = timed(run, values, args.locale, args.tz)
+        print('{:22} {:7.3f}s  {:6.2f}us per show time'.format(name, seconds, seconds / args.count * 1e6))
@@ -0,0 +1,137 @@
+"""
+Load test: N concurrent workers hitting the read pages for a fixed time.
+
+  python bench/loadtest.py --workers 50 --duration 30
+  python bench/loadtest.py --url http://localhost:5000 --workers 64
+
+Without --url the app runs in process (the database from config.py /
+FYYUR_ENV), one thread and test client per worker, and the report includes
+the most connections the pool ever had checked out at once. Exhaustion
+shows as that reaching DB_POOL_SIZE + DB_MAX_OVERFLOW with failed requests.
+With --url it drives a running server over HTTP.
+"""
+import os
+import sys
+import time
+import threading
+import argparse
+import urllib.request
+import urllib.error
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PATHS = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1', '/search?q=a']
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+class InProcess(object):
+
+    def __init__(self):
+        import app as fyyur
+        from sqlalchemy import event
+        self.app = fyyur.app
+        self.checked_out = 0
+        self.high_water = 0
+        self.lock = threading.Lock()
+        with self.app.app_context():
+            self.engine = fyyur.db.engine
+        event.listen(self.engine, 'checkout', self.checkout)
+        event.listen(self.engine, 'checkin', self.checkin)
+
+    def checkout(self, *args):
+        with self.lock:
+            self.checked_out += 1
+            self.high_water = max(self.high_water, self.checked_out)
+
+    def checkin(self, *args):
+        with self.lock:
+            self.checked_out -= 1
+
+    def client(self):
+        client = self.app.test_client()
+        return lambda path: client.get(path).status_code
+
+    def report(self):
+        config = self.app.config
+        print('pool: {} (most checked out at once: {}, limit {})'.format(
+            type(self.engine.pool).__name__, self.high_water, config['DB_POOL_SIZE'] + config['DB_MAX_OVERFLOW']))
+
+
+class OverHTTP(object):
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def client(self):
+        def get(path):
+            try:
+                with urllib.request.urlopen(self.url + path, timeout=30) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+        return get
+
+    def report(self):
+        pass
+
+
+def run(target, workers, duration, paths):
+    stop = time.time() + duration
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker(n):
+        get = target.client()
+        i = n
+        mine = []
+        codes = {}
+        while time.time() < stop:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.time()
+            try:
+                code = get(path)
+            except Exception as e:
+                code = type(e).__name__
+            mine.append(time.time() - start)
+            codes[code] = codes.get(code, 0) + 1
+        with lock:
+            latencies.extend(mine)
+            for code, count in codes.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    print('{} workers, {:.1f}s: {} requests, {:.1f} req/s'.format(workers, elapsed, len(latencies), len(latencies) / elapsed))
+    print('latency p50 {:.1f}ms  p99 {:.1f}ms  max {:.1f}ms'.format(
+        percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000, max(latencies or [0]) * 1000))
+    print('responses: ' + ', '.join('{}: {}'.format(code, count) for code, count in sorted(statuses.items(), key=str)))
+    target.report()
+    return statuses
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--url', help='drive a running server instead of the app in process')
+    parser.add_argument('--workers', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--paths', default=','.join(PATHS), help='comma separated, requested round robin')
+    args = parser.parse_args()
+
+    target = OverHTTP(args.url) if args.url else InProcess()
+    statuses = run(target, args.workers, args.duration, args.paths.split(','))
+    sys.exit(0 if set(statuses) <= {200, 304} else 1)
@@ -0,0 +1,104 @@
+"""
+Render time of each page template with representative data.
+
+  python bench/render.py             # compare with bench/baselines/render.json
+  python bench/render.py --save      # record a new baseline
+
+Exits 1 when a template renders more than --tolerance slower than its
+baseline, so CI catches regressions in e.g. show_venue.html or shows.html.
+Baselines only compare on the same machine, record them on the CI runner.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'render.json')
+IMAGE = 'https://images.unsplash.com/photo-1549213783-8284d0336c4f?w=300&q=80'
+
+
+def show_time(i):
+    return datetime.datetime(2030, 1, 1, 20, 0, tzinfo=pytz.UTC) + datetime.timedelta(days=i)
+
+def detail(other, shows):
+    keys = ('artist_id', 'artist_name', 'artist_image_link') if other == 'artist' else ('venue_id', 'venue_name', 'venue_image_link')
+    listed = [{keys[0]: i, keys[1]: '{} {}'.format(other.title(), i), keys[2]: IMAGE, 'start_time': show_time(i)} for i in range(shows)]
+    return {
+        'id': 1, 'name': 'The Musical Hop', 'genres': ['Jazz', 'Reggae', 'Swing', 'Classical', 'Folk'],
+        'address': '1015 Folsom Street', 'city': 'San Francisco', 'state': 'CA', 'phone': '123-123-1234',
+        'website': 'https://www.themusicalhop.com', 'facebook_link': 'https://www.facebook.com/TheMusicalHop',
+        'seeking_talent': True, 'seeking_venue': True, 'seeking_description': 'Looking for a local artist.',
+        'image_link': IMAGE, 'upcoming_shows': listed[:shows // 2], 'past_shows': listed[shows // 2:],
+        'upcoming_shows_count': shows // 2, 'past_shows_count': shows - shows // 2,
+    }
+
+def contexts():
+    page = {'prev': '/shows?before=abc&per_page=50', 'next': '/shows?after=def&per_page=50'}
+    hits = {'count': 50, 'data': [{'id': i, 'name': 'Venue {}'.format(i), 'num_upcoming_shows': i % 5} for i in range(50)]}
+    facets = dict(hits, genres=[{'name': 'Jazz', 'count': 20, 'url': '/search?genre=Jazz'}],
+        states=[{'name': 'CA', 'count': 30, 'url': '/search?state=CA'}])
+    return {
+        'pages/home.html': {},
+        'pages/venues.html': {'page': page, 'areas': [
+            {'city': 'City {}'.format(a), 'state': 'CA', 'venues': [{'id': a * 10 + i, 'name': 'Venue {}'.format(i), 'num_upcoming_shows': i}
+                for i in range(10)]} for a in range(5)]},
+        'pages/artists.html': {'page': page, 'artists': [{'id': i, 'name': 'Artist {}'.format(i)} for i in range(50)]},
+        'pages/shows.html': {'page': page, 'shows': [{
+            'venue_id': i, 'venue_name': 'Venue {}'.format(i), 'artist_id': i, 'artist_name': 'Artist {}'.format(i),
+            'artist_image_link': IMAGE, 'start_time': show_time(i)} for i in range(50)]},
+        'pages/show_venue.html': {'venue': detail('artist', 200)},
+        'pages/show_artist.html': {'artist': detail('venue', 200)},
+        'pages/search_venues.html': {'results': hits, 'search_term': 'Venue'},
+        'pages/search.html': {'results': facets, 'kind': 'venues', 'criteria': {'term': 'Venue', 'genres': ['Jazz'], 'city': '', 'state': ''}},
+    }
+
+
+def measure(app, name, context, seconds):
+    template = app.jinja_env.get_template(name)
+    template.render(**context)
+    runs = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        template.render(**context)
+        runs += 1
+    return (time.perf_counter() - started) / runs * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--seconds', type=float, default=1.0, help='per template')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--save', action='store_true')
+    args = parser.parse_args()
+
+    from app import app
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+
+    results = {}
+    slower = []
+    with app.test_request_context('/'):
+        for name, context in sorted(contexts().items()):
+            results[name] = round(measure(app, name, context, args.seconds), 1)
+            line = '{:28} {:9.1f}us'.format(name, results[name])
+            if name in baseline:
+                change = results[name] / baseline[name] - 1
+                line += '  {:+.0%} vs baseline'.format(change)
+                if change > args.tolerance:
+                    slower.append(name)
+                    line += '  SLOWER'
+            print(line)
+
+    if args.save:
+        with open(BASELINE, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('baseline saved to ' + BASELINE)
+    sys.exit(1 if slower and not args.save else 0)
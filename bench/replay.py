@@ -0,0 +1,125 @@
+"""
+Replays the request sample the app writes (REQUEST_SAMPLE_FILE, see logs.py).
+
+  python bench/replay.py logs/requests.*.jsonl --url http://localhost:5000 --concurrency 32
+  python bench/replay.py logs/requests.*.jsonl --speed 100   # 100 times the recorded pace
+  python bench/replay.py bench/samples/requests.jsonl --concurrency 4   # the checked-in sample
+
+The files of every worker are merged in time order and their GET requests
+sent again, path and args as recorded, by --concurrency workers. With
+--speed the requests keep the recorded gaps between them (divided by
+--speed; the sample holds REQUEST_SAMPLE_RATE of the traffic, 100 gives
+back the rate of a 1% sample), otherwise each worker sends the next one as
+soon as it is done. Writes are not replayed: their forms are not recorded.
+
+Without --url the app runs in process like bench/loadtest.py. The report
+has the latency of each route next to the recorded one, and the requests
+that got another status than recorded.
+"""
+import os
+import sys
+import json
+import time
+import glob
+import threading
+import argparse
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest import InProcess, OverHTTP, percentile
+
+
+def load(patterns):
+    '''the recorded requests of every file, oldest first, and the count of skipped writes'''
+    entries = []
+    for pattern in patterns:
+        for name in sorted(glob.glob(pattern)):
+            with open(name, encoding='utf-8') as f:
+                entries.extend(json.loads(line) for line in f if line.strip())
+    entries.sort(key=lambda entry: entry['t'])
+    reads = [entry for entry in entries if entry['method'] in ('GET', 'HEAD')]
+    return reads, len(entries) - len(reads)
+
+def url_of(entry):
+    args = entry.get('args')
+    return entry['path'] + ('?' + urllib.parse.urlencode(args, doseq=True) if args else '')
+
+
+def replay(target, entries, concurrency, speed):
+    results = [None] * len(entries)
+    lock = threading.Lock()
+    position = [0]
+    first = entries[0]['t'] if entries else 0
+    started = time.time()
+
+    def worker():
+        get = target.client()
+        while True:
+            with lock:
+                i = position[0]
+                position[0] += 1
+            if i >= len(entries):
+                return
+            entry = entries[i]
+            if speed:
+                delay = started + (entry['t'] - first) / speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            start = time.time()
+            try:
+                code = get(url_of(entry))
+            except Exception as e:
+                code = type(e).__name__
+            results[i] = (code, time.time() - start)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.time() - started
+
+def report(entries, results, elapsed, concurrency):
+    print('{} requests, {} workers, {:.1f}s: {:.1f} req/s'.format(len(entries), concurrency, elapsed,
+        len(entries) / elapsed if elapsed else 0))
+    routes = {}
+    changed = {}
+    for entry, (code, latency) in zip(entries, results):
+        route = routes.setdefault(entry['route'] or 'none', ([], []))
+        route[0].append(latency)
+        route[1].append(entry['ms'] / 1000.0)
+        if code != entry['status']:
+            key = (entry['route'], entry['status'], code)
+            changed[key] = changed.get(key, 0) + 1
+    print('{:24} {:>6}  {:>21}  {:>21}'.format('route', 'count', 'p50 / p99 now', 'p50 / p99 recorded'))
+    for name, (latencies, recorded) in sorted(routes.items(), key=lambda item: -len(item[1][0])):
+        print('{:24} {:6}  {:8.1f} / {:8.1f}ms  {:8.1f} / {:8.1f}ms'.format(name, len(latencies),
+            percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000,
+            percentile(recorded, 50) * 1000, percentile(recorded, 99) * 1000))
+    for (route, recorded, code), count in sorted(changed.items(), key=str):
+        print('{}: {} instead of {} ({} requests)'.format(route, code, recorded, count))
+    return changed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('files', nargs='+', help='request sample files, globs are expanded')
+    parser.add_argument('--url', help='drive a running server instead of the app in process')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--speed', type=float, default=0, help='keep the recorded pace, this many times faster')
+    parser.add_argument('--limit', type=int, help='replay the first LIMIT requests only')
+    args = parser.parse_args()
+
+    entries, writes = load(args.files)
+    if args.limit:
+        entries = entries[:args.limit]
+    if writes:
+        print('{} writes skipped'.format(writes))
+    if not entries:
+        sys.exit('no requests to replay')
+    target = OverHTTP(args.url) if args.url else InProcess()
+    results, elapsed = replay(target, entries, args.concurrency, args.speed)
+    changed = report(entries, results, elapsed, args.concurrency)
+    target.report()
+    sys.exit(1 if changed else 0)
@@ -0,0 +1,150 @@
+"""
+Fills the database (DATABASE_URL / FYYUR_ENV, as the app) with synthetic
+venues, artists and shows, for the benchmarks.
+
+  python bench/seed.py                                   # 10k venues, 50k artists, 1M shows
+  python bench/seed.py --venues 100 --artists 500 --shows 10000 --reset
+
+Every state of StateRestiction and genre of GenreRestiction is used, with
+skew like real data: a few states, cities and genres hold most of the rows,
+and a few artists and venues play most of the shows. 60% of the shows are
+past, the rest spread over the next year. The same --seed gives the same
+rows. The show counters are set as the rows go in, so they are exact.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ('Blue', 'Red', 'Golden', 'Silver', 'Velvet', 'Electric', 'Midnight', 'Lucky', 'Broken', 'Wild',
+         'Little', 'Big', 'Crystal', 'Neon', 'Iron', 'Hollow', 'Northern', 'Southern', 'Lost', 'Young')
+VENUE_NOUNS = ('Hall', 'Room', 'Lounge', 'Club', 'Tavern', 'Theatre', 'Garden', 'Cellar', 'Barn', 'Stage')
+ARTIST_NOUNS = ('Wolves', 'Sisters', 'Brothers', 'Kings', 'Echoes', 'Rivers', 'Machines', 'Lights', 'Trio', 'Band')
+IMAGE = 'https://images.unsplash.com/photo-1549213783-8284d0336c4f?w=300&q=80'
+
+
+def skewed(rng, items, s=1.1):
+    # zipf like weights, the first items are the most common
+    weights = [1.0 / (i + 1) ** s for i in range(len(items))]
+    return lambda: rng.choices(items, weights)[0]
+
+def phone(rng):
+    return '{:03}-{:03}-{:04}'.format(rng.randint(200, 999), rng.randint(200, 999), rng.randint(0, 9999))
+
+
+def generate(rng, venues, artists, shows, now):
+    '''
+    the rows of each table as dicts, ids from 1. Counters are computed
+    against `now`, the show counters' watermark.
+    '''
+    from forms import StateRestiction, GenreRestiction
+    states = [state.value for state in StateRestiction]
+    rng.shuffle(states)
+    genres = [genre.value for genre in GenreRestiction]
+    rng.shuffle(genres)
+    state = skewed(rng, states)
+    genre = skewed(rng, genres, 0.8)
+    city = skewed(rng, ['City {}'.format(i) for i in range(200)])
+
+    def name(nouns, i):
+        return '{} {} {}'.format(rng.choice(WORDS), rng.choice(nouns), i)
+
+    def links(kind, i):
+        return {
+            'image_link': IMAGE,
+            'facebook_link': 'https://www.facebook.com/{}{}'.format(kind, i),
+            'website_link': 'https://{}{}.example.com'.format(kind, i),
+        }
+
+    venue_rows = [dict(links('venue', i), id=i, name=name(VENUE_NOUNS, i), city=city(), state=state(),
+        address='{} {} Street'.format(rng.randint(1, 9999), rng.choice(WORDS)), phone=phone(rng),
+        seeking_talent=rng.random() < 0.3, seeking_description='Looking for local acts.',
+        upcoming_shows_count=0, past_shows_count=0) for i in range(1, venues + 1)]
+    artist_rows = [dict(links('artist', i), id=i, name=name(ARTIST_NOUNS, i), city=city(), state=state(),
+        phone=phone(rng), seeking_venues=rng.random() < 0.3, seeking_description='Touring next spring.',
+        upcoming_shows_count=0, past_shows_count=0) for i in range(1, artists + 1)]
+
+    def genre_rows(owner, count):
+        rows = []
+        for i in range(1, count + 1):
+            names = set(genre() for _ in range(rng.randint(1, 3)))
+            rows.extend({owner: i, 'name': g} for g in sorted(names))
+        return rows
+
+    # popular venues and artists play most shows
+    venue_weights = [1.0 / (i + 1) ** 0.7 for i in range(venues)]
+    artist_weights = [1.0 / (i + 1) ** 0.7 for i in range(artists)]
+    venue_ids = rng.choices(range(1, venues + 1), venue_weights, k=shows)
+    artist_ids = rng.choices(range(1, artists + 1), artist_weights, k=shows)
+    show_rows = []
+    # an artist plays one show at a time (the unique artist_id, date)
+    taken = set()
+    for i in range(shows):
+        while True:
+            past = rng.random() < 0.6
+            offset = rng.randint(1, 3 * 365 * 86400) if past else rng.randint(1, 365 * 86400)
+            if (artist_ids[i], past, offset) not in taken:
+                taken.add((artist_ids[i], past, offset))
+                break
+        if past:
+            date = now - datetime.timedelta(seconds=offset)
+            counter = 'past_shows_count'
+        else:
+            date = now + datetime.timedelta(seconds=offset)
+            counter = 'upcoming_shows_count'
+        venue_rows[venue_ids[i] - 1][counter] += 1
+        artist_rows[artist_ids[i] - 1][counter] += 1
+        show_rows.append({'id': i + 1, 'venue_id': venue_ids[i], 'artist_id': artist_ids[i], 'date': date})
+    return venue_rows, artist_rows, genre_rows('venue', venues), genre_rows('artist', artists), show_rows
+
+
+def insert(db, table, rows, batch=10000):
+    for start in range(0, len(rows), batch):
+        db.session.execute(table.insert(), rows[start:start + batch])
+
+def seed(venues, artists, shows, seed=0, reset=False):
+    from app import db, Venue, Artist, Show, VenueGenre, ArtistGenre, ShowCounterState, venue_search, artist_search
+    tables = [VenueGenre, ArtistGenre, Show, Venue, Artist]
+    db.create_all()
+    if reset:
+        for model in tables:
+            db.session.execute(model.__table__.delete())
+    elif any(db.session.query(model.id).first() for model in tables):
+        raise SystemExit('the database has rows already, seed it with --reset')
+
+    # the counters are exact as of the watermark, so shows are generated around it
+    now = datetime.datetime.now(tz=pytz.UTC)
+    db.session.query(ShowCounterState).filter(ShowCounterState.id == 1).update({'rolled_over_at': now})
+    venue_rows, artist_rows, venue_genres, artist_genres, show_rows = generate(random.Random(seed), venues, artists, shows, now)
+    for model, rows in ((Venue, venue_rows), (Artist, artist_rows), (VenueGenre, venue_genres),
+                        (ArtistGenre, artist_genres), (Show, show_rows)):
+        started = time.time()
+        insert(db, model.__table__, rows)
+        print('{:13} {:9} rows in {:.1f}s'.format(model.__tablename__, len(rows), time.time() - started))
+    if db.session.bind.dialect.name == 'postgresql':
+        # the ids were given, move the sequences past them
+        for model in tables:
+            table = model.__tablename__
+            db.session.execute("SELECT setval(pg_get_serial_sequence('{0}', 'id'), COALESCE(MAX(id), 1)) FROM {0}".format(table))
+    db.session.commit()
+    venue_search.invalidate()
+    artist_search.invalidate()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--artists', type=int, default=50000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--reset', action='store_true', help='delete every venue, artist and show first')
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        seed(args.venues, args.artists, args.shows, args.seed, args.reset)
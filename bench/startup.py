@@ -0,0 +1,89 @@
+"""
+Cold start and memory of the production server.
+
+  python bench/startup.py --workers 4
+
+Starts gunicorn (gunicorn.conf.py, wsgi.py) with and without preload_app,
+and reports the time from launch to the first byte of a page, then the
+resident (RSS) and proportional (PSS, shared pages split between the
+processes that share them) memory of the master and of each worker.
+Linux only, it reads /proc.
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def first_byte(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                response.read(1)
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('no response from {}'.format(url))
+
+
+def memory(pid):
+    # (rss, pss) in MB
+    rss = pss = 0
+    with open('/proc/{}/status'.format(pid)) as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as smaps:
+            for line in smaps:
+                if line.startswith('Pss:'):
+                    pss = int(line.split()[1])
+    except IOError:
+        pass
+    return rss / 1024.0, pss / 1024.0
+
+
+def children(pid):
+    with open('/proc/{0}/task/{0}/children'.format(pid)) as f:
+        return [int(child) for child in f.read().split()]
+
+
+def measure(preload, workers, port, path):
+    env = dict(os.environ, FYYUR_PRELOAD='1' if preload else '0', FYYUR_WORKERS=str(workers),
+        FYYUR_BIND='127.0.0.1:{}'.format(port))
+    # the production profile does not start without one
+    env.setdefault('SECRET_KEY', 'startup-bench')
+    started = time.time()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn'], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first_byte('http://127.0.0.1:{}{}'.format(port, path))
+        ready = time.time() - started
+        # let every worker boot before reading their memory
+        deadline = time.time() + 30
+        while len(children(server.pid)) < workers and time.time() < deadline:
+            time.sleep(0.1)
+        time.sleep(1)
+        print('== preload_app={}'.format(preload))
+        print('cold start to first byte of {}: {:.0f}ms'.format(path, ready * 1000))
+        print('master  rss {:6.1f}MB  pss {:6.1f}MB'.format(*memory(server.pid)))
+        for pid in children(server.pid):
+            print('worker  rss {:6.1f}MB  pss {:6.1f}MB'.format(*memory(pid)))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--path', default='/')
+    args = parser.parse_args()
+    for preload in (True, False):
+        measure(preload, args.workers, args.port, args.path)
@@ -0,0 +1,229 @@
+"""
+Benchmark of every route, in process, on a database filled by bench/seed.py.
+
+  python bench/seed.py --venues 1000 --artists 5000 --shows 100000 --reset
+  python bench/suite.py              # compare with bench/baselines/routes.json
+  python bench/suite.py --latency    # the latencies too, on the machine of the baseline
+  python bench/suite.py --save       # record the baseline of this data volume
+
+Each route runs --iterations times (after --warmup runs) through the test
+client, with the testing profile (no page cache, no CSRF) unless FYYUR_ENV
+says otherwise. The report has p50 / p99 latency and the SQL statements of
+each route, taken from the request log of instrumentation.py (for a
+streamed response, the statements before it started streaming).
+
+Baselines are kept per data volume. A route fails the run when it runs more
+statements than its baseline (an N+1 creeping in), or when it answers with an
+error (or a database error its view caught). Those hold on any machine.
+With --latency it also fails when its p50 is more than --tolerance over the
+baseline (and at least --slack ms), or its p99 more than twice that. Like
+bench/render.py, latencies only compare on the machine that saved them.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import warnings
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('FYYUR_ENV', 'testing')
+
+from loadtest import percentile
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'routes.json')
+
+
+class Requests(logging.Handler):
+    """ Keeps the last request record of the instrumentation log """
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.last = None
+
+    def emit(self, record):
+        self.last = record.fields
+
+
+def rounded(n):
+    # two significant figures, so the writes of a run do not change the volume
+    return int(float('{:.2g}'.format(n))) if n else 0
+
+def volume(fyyur):
+    db = fyyur.db
+    return '{} venues, {} artists, {} shows'.format(*[rounded(db.session.query(db.func.count(model.id)).scalar())
+        for model in (fyyur.Venue, fyyur.Artist, fyyur.Show)])
+
+def form_of(owner, fields):
+    data = dict((field, getattr(owner, field)) for field in fields)
+    data['genres'] = [genre.name for genre in owner.genres]
+    return dict((k, 'y' if v is True else v) for k, v in data.items() if v is not None and v is not False)
+
+def routes(fyyur):
+    '''
+    (name, method, path, form data) of every route, on the busiest and a
+    typical venue and artist
+    '''
+    db, Venue, Artist = fyyur.db, fyyur.Venue, fyyur.Artist
+    shows = Venue.upcoming_shows_count + Venue.past_shows_count
+    busy_venue = Venue.query.order_by(shows.desc()).first()
+    venue = Venue.query.order_by(shows).offset(Venue.query.count() // 2).first()
+    shows = Artist.upcoming_shows_count + Artist.past_shows_count
+    busy_artist = Artist.query.order_by(shows.desc()).first()
+    artist = Artist.query.order_by(shows).offset(Artist.query.count() // 2).first()
+    word = venue.name.split()[0]
+    genre = venue.genres[0].name
+    venue_form = form_of(venue, ('name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+        'website_link', 'seeking_talent', 'seeking_description'))
+    artist_form = form_of(artist, ('name', 'city', 'state', 'phone', 'image_link', 'facebook_link',
+        'website_link', 'seeking_venues', 'seeking_description'))
+    db.session.remove()
+
+    # fresh rows for every run, delete_artist takes back what create_artist adds
+    run = int(time.time())
+    start = datetime.datetime(2045, 1, 1) + datetime.timedelta(seconds=run % 10 ** 7)
+    new_shows = ({'artist_id': artist.id, 'venue_id': venue.id,
+        'start_time': (start + datetime.timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S')} for i in range(10 ** 6))
+    new_artists = (dict(artist_form, name='Benchmark Artist {} {}'.format(run, i)) for i in range(10 ** 6))
+
+    return [
+        ('index', 'GET', '/', None),
+        ('venues', 'GET', '/venues', None),
+        ('venues_100', 'GET', '/venues?per_page=100', None),
+        ('show_venue_busy', 'GET', '/venues/{}'.format(busy_venue.id), None),
+        ('show_venue', 'GET', '/venues/{}'.format(venue.id), None),
+        ('search_venues', 'POST', '/venues/search', {'search_term': word}),
+        ('artists', 'GET', '/artists', None),
+        ('show_artist_busy', 'GET', '/artists/{}'.format(busy_artist.id), None),
+        ('show_artist', 'GET', '/artists/{}'.format(artist.id), None),
+        ('search_artists', 'POST', '/artists/search', {'search_term': word}),
+        ('search', 'GET', '/search?q={}'.format(word), None),
+        ('search_facets', 'GET', '/search?genre={}&state={}'.format(genre, venue.state), None),
+        ('shows', 'GET', '/shows', None),
+        ('shows_100', 'GET', '/shows?per_page=100', None),
+        ('create_venue_form', 'GET', '/venues/create', None),
+        ('create_artist_form', 'GET', '/artists/create', None),
+        ('create_show_form', 'GET', '/shows/create', None),
+        ('edit_venue_form', 'GET', '/venues/{}/edit'.format(venue.id), None),
+        ('edit_artist_form', 'GET', '/artists/{}/edit'.format(artist.id), None),
+        ('edit_venue', 'POST', '/venues/{}/edit'.format(venue.id), venue_form),
+        ('edit_artist', 'POST', '/artists/{}/edit'.format(artist.id), artist_form),
+        ('create_show', 'POST', '/shows/create', new_shows),
+        ('create_artist', 'POST', '/artists/create', new_artists),
+        ('delete_artist', 'POST', None, None),
+        ('api_venues', 'GET', '/api/v1/venues', None),
+        ('api_venue', 'GET', '/api/v1/venues/{}'.format(busy_venue.id), None),
+        ('api_artists', 'GET', '/api/v1/artists', None),
+        ('api_artist', 'GET', '/api/v1/artists/{}'.format(busy_artist.id), None),
+        ('api_shows', 'GET', '/api/v1/shows', None),
+        ('export_venues', 'GET', '/export/venues?format=jsonl', None),
+        ('metrics', 'GET', '/metrics', None),
+    ]
+
+def benchmarked(fyyur, route, client, requests, iterations, warmup):
+    name, method, path, data = route
+    latencies = []
+    statements = 0
+    errors = 0
+    for i in range(warmup + iterations):
+        form = next(data) if hasattr(data, '__next__') else data
+        url = path
+        if name == 'delete_artist':
+            # the artist create_artist just made
+            url = '/artists/{}'.format(fyyur.db.session.query(fyyur.db.func.max(fyyur.Artist.id)).scalar())
+            fyyur.db.session.remove()
+        requests.last = None
+        started = time.perf_counter()
+        response = client.open(url, method=method, data=form)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        if response.status_code >= 400:
+            errors += 1
+        if requests.last is not None:
+            statements = max(statements, requests.last['db_statements'])
+            # a view that caught a database error answers 200 all the same
+            errors += bool(requests.last['db_errors'])
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'statements': statements,
+        'errors': errors,
+    }
+
+def regressions(name, result, baseline, tolerance=None, slack=None):
+    # the latencies are compared only with a tolerance
+    found = []
+    if result['errors']:
+        found.append('{} errors'.format(result['errors']))
+    if baseline is None:
+        return found
+    if result['statements'] > baseline['statements']:
+        found.append('statements {} > {}'.format(result['statements'], baseline['statements']))
+    if tolerance is None:
+        return found
+    # p99 of a few dozen runs is one slow run (a gc pass), it gets twice the room
+    for key, room in (('p50_ms', 1), ('p99_ms', 2)):
+        limit = max(baseline[key] * (1 + tolerance * room), baseline[key] + slack * room)
+        if result[key] > limit:
+            found.append('{} {:.1f}ms > {:.1f}ms'.format(key[:3], result[key], limit))
+    return found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--routes', help='comma separated names, all by default')
+    parser.add_argument('--latency', action='store_true', help='fail on slower latencies too (same machine only)')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='p50 may grow by this fraction')
+    parser.add_argument('--slack', type=float, default=5.0, help='and by at least this many ms')
+    parser.add_argument('--save', action='store_true')
+    args = parser.parse_args()
+
+    import app as fyyur
+    # the forms' FlaskWTFDeprecationWarning, once per request
+    warnings.simplefilter('ignore')
+    requests = Requests()
+    fyyur.instrumentation.logger.addHandler(requests)
+    fyyur.instrumentation.logger.setLevel(logging.INFO)
+    fyyur.instrumentation.logger.propagate = False
+
+    baselines = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baselines = json.load(f)
+
+    client = fyyur.app.test_client()
+    with fyyur.app.app_context():
+        size = volume(fyyur)
+        selected = routes(fyyur)
+    if args.routes:
+        wanted = set(args.routes.split(','))
+        selected = [route for route in selected if route[0] in wanted]
+    baseline = baselines.get(size, {})
+    print(size + ('' if baseline else ' (no baseline)'))
+
+    results = {}
+    failed = False
+    with fyyur.app.app_context():
+        for route in selected:
+            name = route[0]
+            results[name] = result = benchmarked(fyyur, route, client, requests, args.iterations, args.warmup)
+            found = regressions(name, result, baseline.get(name), *(args.tolerance, args.slack) if args.latency else ())
+            failed = failed or bool(found)
+            print('{:20} p50 {:8.2f}ms  p99 {:8.2f}ms  {:3} statements  {}'.format(
+                name, result['p50_ms'], result['p99_ms'], result['statements'], '  '.join(found)))
+
+    if args.save:
+        baselines[size] = dict(baseline, **dict((name, dict((k, v) for k, v in result.items() if k != 'errors'))
+            for name, result in results.items()))
+        with open(BASELINE, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('baseline saved to ' + BASELINE)
+    sys.exit(1 if failed else 0)
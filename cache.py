@@ -0,0 +1,278 @@
+import time
+import hashlib
+import threading
+import functools
+import pytz
+from collections import OrderedDict
+from flask import request, session, g, make_response, Response
+from sqlalchemy import event
+
+
+#---------------------------------------------------------------------------------
+# Backends
+#---------------------------------------------------------------------------------
+
+class LRUBackend(object):
+    """ In process least recently used cache, private to each worker """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.items = OrderedDict()
+        # tag versions are kept apart and never evicted, they are tiny and
+        # losing one would bring back pages cached under its older versions
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def get_many(self, keys):
+        with self.lock:
+            return [self.versions.get(key) for key in keys]
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def incr(self, key):
+        with self.lock:
+            self.versions[key] = self.versions.get(key, 0) + 1
+            return self.versions[key]
+
+    def put(self, key, value):
+        # an integer read back by get_many, kept like the versions
+        with self.lock:
+            self.versions[key] = value
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.versions.clear()
+
+
+class RedisBackend(object):
+    """ Cache shared by every worker and host, needs the redis package.
+    Pages expire after `timeout`, tag versions never do. """
+
+    def __init__(self, url, timeout=3600, prefix='fyyur:'):
+        import redis
+        import pickle
+        self.client = redis.StrictRedis.from_url(url)
+        self.pickle = pickle
+        self.timeout = timeout
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else self.pickle.loads(value)
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [None if v is None else int(v) for v in self.client.mget([self.prefix + key for key in keys])]
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, self.pickle.dumps(value), ex=self.timeout)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def put(self, key, value):
+        self.client.set(self.prefix + key, int(value))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def make_backend(config):
+    kind = config.get('PAGE_CACHE')
+    if kind == 'lru':
+        return LRUBackend(config.get('PAGE_CACHE_SIZE', 1024))
+    if kind == 'redis':
+        return RedisBackend(config['PAGE_CACHE_URL'], config.get('PAGE_CACHE_TIMEOUT', 3600))
+    return None
+
+
+#---------------------------------------------------------------------------------
+# Page cache
+#---------------------------------------------------------------------------------
+
+class PageCache(object):
+    """
+    Caches rendered GET pages by path and arguments.
+    Every page is stored with the tags of the rows it shows ("venue:3", "shows")
+    and the version of each tag at render time. Committing a change to a row
+    bumps the versions of its tags, so every page that showed it misses on its
+    next hit, in every worker sharing the backend.
+    `variant()` returns what else a page depends on (locale, time zone),
+    pages are stored apart for each variant. `observe('hit' or 'miss')` is
+    told the outcome of every lookup.
+    `staleness()` returns how many seconds the data of the request may be
+    behind the last commit (a read replica). A page rendered from such data
+    is not stored when one of its tags changed within that time: it may not
+    show the change, yet would be stored under the new versions.
+    """
+
+    def __init__(self, backend, db, tags_for, timeout=3600, variant=None, observe=None, staleness=None):
+        self.backend = backend
+        self.db = db
+        self.timeout = timeout
+        self.variant = variant
+        self.observe = observe
+        self.staleness = staleness
+        # tags_for(obj, created_or_deleted) -> tags a change to obj invalidates
+        self.tags_for = tags_for
+        if backend is None:
+            return
+        event.listen(db.session, 'after_flush', self.collect)
+        event.listen(db.session, 'after_bulk_delete', self.collect_bulk)
+        event.listen(db.session, 'after_bulk_update', self.collect_bulk)
+        event.listen(db.session, 'after_commit', self.invalidate)
+        event.listen(db.session, 'after_soft_rollback', self.discard)
+
+    #  Invalidation
+    #  ----------------------------------------------------------------
+
+    def collect(self, db_session, flush_context):
+        tags = db_session.info.setdefault('page_cache_tags', set())
+        for obj in db_session.new:
+            tags.update(self.tags_for(obj, True))
+        for obj in db_session.deleted:
+            tags.update(self.tags_for(obj, True))
+        for obj in db_session.dirty:
+            if db_session.is_modified(obj, include_collections=False):
+                tags.update(self.tags_for(obj, False))
+
+    def mark(self, *tags):
+        # for rows written with core statements, which flushes do not see
+        if self.backend is not None:
+            self.db.session.info.setdefault('page_cache_tags', set()).update(tags)
+
+    def collect_bulk(self, context):
+        # the rows of a bulk statement are unknown, drop every page
+        context.session.info['page_cache_clear'] = True
+
+    def discard(self, db_session, previous_transaction):
+        db_session.info.pop('page_cache_tags', None)
+        db_session.info.pop('page_cache_clear', None)
+
+    def invalidate(self, db_session):
+        tags = db_session.info.pop('page_cache_tags', None)
+        if db_session.info.pop('page_cache_clear', None):
+            self.backend.clear()
+            return
+        now = int(time.time() * 1000)
+        for tag in tags or ():
+            self.backend.incr('tag:' + tag)
+            self.backend.put('changed:' + tag, now)
+
+    #  Pages
+    #  ----------------------------------------------------------------
+
+    def tag(self, *tags):
+        # called by a view for the rows the page shows
+        g.setdefault('page_cache_tags', set()).update(tags)
+
+    def cached(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # flashed messages are part of the page, those renders are not shared
+            # (`in` leaves the session unaccessed, no Vary: Cookie)
+            if self.backend is None or request.method != 'GET' or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            key = 'page:' + request.full_path
+            if self.variant is not None:
+                key += '|' + self.variant()
+            entry = self.backend.get(key)
+            if entry is not None:
+                expires, tags, versions, body = entry
+                if expires > time.time() and self.backend.get_many(['tag:' + tag for tag in tags]) == versions:
+                    if self.observe is not None:
+                        self.observe('hit')
+                    return body
+            if self.observe is not None:
+                self.observe('miss')
+
+            g.page_cache_tags = set()
+            started = time.time()
+            body = view(*args, **kwargs)
+            # an untagged page is an error or not found page, never stored
+            if isinstance(body, str) and g.page_cache_tags:
+                # a change committed between the view's queries and this read
+                # goes unnoticed, the timeout bounds how long that page lives
+                tags = sorted(g.page_cache_tags)
+                if self.settled(tags, started):
+                    versions = self.backend.get_many(['tag:' + tag for tag in tags])
+                    self.backend.set(key, (time.time() + self.timeout, tags, versions, body))
+            return body
+        return wrapper
+
+    def settled(self, tags, started):
+        # whether the data the page was rendered from has every change to its tags
+        staleness = self.staleness() if self.staleness is not None else 0
+        if not staleness:
+            return True
+        since = (started - staleness) * 1000
+        return all(changed is None or changed < since for changed in self.backend.get_many(['changed:' + tag for tag in tags]))
+
+
+#---------------------------------------------------------------------------------
+# Conditional GET
+#---------------------------------------------------------------------------------
+
+def http_date(value):
+    # naive utc with whole seconds, what the headers carry
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(pytz.UTC).replace(tzinfo=None)
+    return value.replace(microsecond=0)
+
+def conditional(stamp, salt='', variant=None):
+    '''
+    answers If-None-Match / If-Modified-Since with a 304 before the view runs.
+    `stamp(*args, **kwargs)` returns a cheap version of what the view would
+    render, as (parts, last_modified), or None to skip the check (e.g. the row
+    does not exist). `salt` changes every ETag, bump it when templates change.
+    `variant()` returns what else the page depends on (locale, time zone).
+    '''
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or '_flashes' in session:
+                return view(*args, **kwargs)
+            version = stamp(*args, **kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+
+            parts, last_modified = version
+            extra = variant() if variant is not None else None
+            etag = hashlib.sha1(repr((salt, extra, request.full_path, parts)).encode('utf-8')).hexdigest()
+            last_modified = http_date(last_modified)
+
+            if request.if_none_match:
+                fresh = request.if_none_match.contains(etag)
+            else:
+                since = http_date(request.if_modified_since)
+                fresh = since is not None and last_modified is not None and last_modified <= since
+            if fresh:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,165 @@
+import pytz
+from sqlalchemy import func, select, and_
+
+
+#---------------------------------------------------------------------------------
+# Show counters
+#---------------------------------------------------------------------------------
+
+def as_utc(value):
+    # sqlite gives timestamps back without their zone, they were stored in UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=pytz.UTC)
+    return value.astimezone(pytz.UTC)
+
+
+class ShowCounters(object):
+    """
+    Keeps `upcoming_shows_count` and `past_shows_count` of every owner of a show
+    (venue, artist) up to date, so listings do not have to count shows per row.
+
+    The stored counters are exact as of the watermark kept in `state_model`:
+    upcoming is `date > watermark` and past is `date < watermark`, the same
+    strict comparisons the views use against `now`. Shows whose date fell between
+    the watermark and `now` are corrected for at read time, and `rollover()` moves
+    the watermark forward so that window stays small.
+    Updates go through core statements: they only touch derived counts, so they
+    must not look like edits to the rows to ORM event listeners.
+    """
+
+    def __init__(self, db, show_model, state_model, owners):
+        self.db = db
+        self.show = show_model
+        self.state = state_model
+        # owner model -> foreign key column on the show
+        self.owners = owners
+
+    def watermark(self):
+        # as a scalar subquery, so reads never need an extra round trip
+        return select([self.state.rolled_over_at]).where(self.state.id == 1).as_scalar()
+
+    def count(self, fk, model, *criteria):
+        return select([func.count(self.show.id)]).where(and_(fk == model.id, *criteria)).as_scalar()
+
+    #  Reads
+    #  ----------------------------------------------------------------
+
+    def upcoming(self, model, now):
+        '''
+        returns the number of upcoming shows at `now` as a column of `model`:
+        the counter less the shows of the window, counted per row by a
+        correlated subquery (on the show index of the owner). A listing can
+        then walk its own index and stop at the page size, where a join to
+        the grouped window would have to sort every row first.
+        '''
+        fk = self.owners[model]
+        window = self.count(fk, model, self.show.date > self.watermark(), self.show.date <= now)
+        return model.upcoming_shows_count - window
+
+    #  Writes
+    #  ----------------------------------------------------------------
+
+    def apply(self, shows, sign, models=None):
+        '''
+        adds (sign=1) or removes (sign=-1) the shows selected by the `shows`
+        subquery of show ids to the counters of their venues and artists
+        (or of `models` only). Call it in the same transaction as the insert,
+        before the delete.
+        '''
+        watermark = self.watermark()
+        for model, fk in self.owners.items():
+            if models is not None and model not in models:
+                continue
+            selected = self.show.id.in_(shows)
+            self.db.session.execute(model.__table__.update().where(
+                model.id.in_(select([fk]).where(selected))
+            ).values(
+                upcoming_shows_count=model.upcoming_shows_count + sign * self.count(fk, model, selected, self.show.date > watermark),
+                past_shows_count=model.past_shows_count + sign * self.count(fk, model, selected, self.show.date < watermark),
+            ))
+
+    def shows_added(self, shows):
+        self.apply(shows, 1)
+
+    def shows_removed(self, shows, models=None):
+        self.apply(shows, -1, models)
+
+    def recount(self, owners):
+        '''
+        overwrites the counters of the given owners ({model: ids}) with live
+        counts at the watermark, for writes that do not know their show ids
+        (executemany inserts). Call it in the same transaction.
+        '''
+        watermark = self.watermark()
+        date = self.show.date
+        for model, ids in owners.items():
+            if not ids:
+                continue
+            fk = self.owners[model]
+            self.db.session.execute(model.__table__.update().where(
+                model.id.in_(ids)
+            ).values(
+                upcoming_shows_count=self.count(fk, model, date > watermark),
+                past_shows_count=self.count(fk, model, date < watermark),
+            ))
+
+    def rollover(self, now):
+        '''
+        moves the watermark to `now`, turning the shows that started in between
+        from upcoming into past. Commits, meant to run periodically.
+        '''
+        session = self.db.session
+        state = session.query(self.state).with_for_update().get(1)
+        start = as_utc(state.rolled_over_at)
+        now = as_utc(now)
+        if now <= start:
+            session.rollback()
+            return 0
+
+        date = self.show.date
+        moved = session.query(self.show.id).filter(date >= start, date <= now).count()
+        for model, fk in self.owners.items():
+            session.execute(model.__table__.update().where(
+                model.id.in_(select([fk]).where(and_(date >= start, date <= now)))
+            ).values(
+                upcoming_shows_count=model.upcoming_shows_count - self.count(fk, model, date > start, date <= now),
+                past_shows_count=model.past_shows_count + self.count(fk, model, date >= start, date < now),
+            ))
+        state.rolled_over_at = now
+        session.commit()
+        return moved
+
+    #  Consistency
+    #  ----------------------------------------------------------------
+
+    def check(self, repair=False):
+        '''
+        compares every stored counter against a live COUNT at the watermark.
+        returns the mismatches as (table, id, column, stored, actual) and,
+        with repair=True, overwrites the stored values with the live ones.
+        '''
+        session = self.db.session
+        session.query(self.state).with_for_update().get(1)
+        watermark = self.watermark()
+        date = self.show.date
+        mismatches = []
+        for model, fk in self.owners.items():
+            upcoming = self.count(fk, model, date > watermark)
+            past = self.count(fk, model, date < watermark)
+            rows = session.query(
+                model.id, model.upcoming_shows_count, upcoming, model.past_shows_count, past
+            ).filter((model.upcoming_shows_count != upcoming) | (model.past_shows_count != past)).all()
+            for id, stored_upcoming, live_upcoming, stored_past, live_past in rows:
+                if stored_upcoming != live_upcoming:
+                    mismatches.append((model.__tablename__, id, 'upcoming_shows_count', stored_upcoming, live_upcoming))
+                if stored_past != live_past:
+                    mismatches.append((model.__tablename__, id, 'past_shows_count', stored_past, live_past))
+            if repair and rows:
+                session.execute(model.__table__.update().where(
+                    model.id.in_([row[0] for row in rows])
+                ).values(upcoming_shows_count=upcoming, past_shows_count=past))
+        if repair:
+            session.commit()
+        else:
+            session.rollback()
+        return mismatches
@@ -0,0 +1,100 @@
+import functools
+import dateutil.parser
+import pytz
+from babel import Locale
+from babel.dates import parse_pattern
+from flask import g, request, has_request_context
+
+
+#---------------------------------------------------------------------------------
+# Formatting
+#---------------------------------------------------------------------------------
+
+# named formats of the datetime filter, anything else is a babel pattern
+named_formats = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+@functools.lru_cache(maxsize=None)
+def compiled(format, locale):
+    '''
+    the parsed pattern and the loaded locale of a (format, locale) pair.
+    babel.dates.format_datetime parses both again on every call.
+    '''
+    return parse_pattern(named_formats.get(format, format)), Locale.parse(locale)
+
+@functools.lru_cache(maxsize=None)
+def zone(name):
+    return pytz.timezone(name)
+
+@functools.lru_cache(maxsize=8192)
+def format_datetime(value, format='medium', locale='en_US', tz='UTC'):
+    '''
+    formats a datetime, naive ones are taken as UTC. Pages show the same
+    few hundred show times over and over, so the results are memoized.
+    '''
+    pattern, locale = compiled(format, locale)
+    if value.tzinfo is None:
+        value = pytz.UTC.localize(value)
+    return pattern.apply(value.astimezone(zone(tz)), locale)
+
+
+#---------------------------------------------------------------------------------
+# Display settings
+#---------------------------------------------------------------------------------
+
+class Localization(object):
+    """
+    Picks the locale and time zone dates are shown in, per request:
+    - the locale from the `locale` cookie, else the best of LOCALES for the
+      Accept-Language header, else DEFAULT_LOCALE,
+    - the time zone from the `tz` cookie (an Olson name), else DEFAULT_TIMEZONE.
+    and registers the `datetime` template filter that uses them.
+    """
+
+    def __init__(self, app):
+        self.locales = list(app.config['LOCALES'])
+        self.default_locale = app.config['DEFAULT_LOCALE']
+        self.default_timezone = app.config['DEFAULT_TIMEZONE']
+        for locale in self.locales:
+            # a typo in the config fails at startup, not on a page
+            Locale.parse(locale)
+        zone(self.default_timezone)
+        app.before_request(self.select)
+        if len(self.locales) > 1:
+            app.after_request(self.vary)
+        app.jinja_env.filters['datetime'] = self.filter
+
+    def select(self):
+        locale = request.cookies.get('locale')
+        if locale not in self.locales:
+            locale = request.accept_languages.best_match(self.locales) or self.default_locale
+        tz = request.cookies.get('tz')
+        if tz not in pytz.all_timezones_set:
+            tz = self.default_timezone
+        g.locale = locale
+        g.timezone = tz
+
+    def vary(self, response):
+        response.vary.add('Accept-Language')
+        return response
+
+    def current(self):
+        # (locale, time zone) of this request, the defaults outside one
+        if has_request_context() and 'locale' in g:
+            return g.locale, g.timezone
+        return self.default_locale, self.default_timezone
+
+    def variant(self):
+        # what, besides the url, a rendered page depends on (cache keys, ETags)
+        return '{}|{}'.format(*self.current())
+
+    def filter(self, value, format='medium'):
+        if value is None:
+            return ''
+        if isinstance(value, str):
+            # the mock data of the templates still passes strings
+            value = dateutil.parser.parse(value)
+        locale, tz = self.current()
+        return format_datetime(value, format, locale, tz)
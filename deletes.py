@@ -0,0 +1,100 @@
+import datetime
+import pytz
+from sqlalchemy import Table, Column, DateTime, Index, select, literal
+
+
+#---------------------------------------------------------------------------------
+# Archive tables
+#---------------------------------------------------------------------------------
+
+def archive_table(metadata, table):
+    '''
+    <table>_archive: the columns of `table` plus archived_at, without its keys
+    and constraints, so archived rows never block or cascade anything.
+    '''
+    columns = [Column(column.name, column.type, nullable=column.nullable) for column in table.columns]
+    name = table.name + '_archive'
+    return Table(name, metadata, *columns + [
+        Column('archived_at', DateTime(timezone=True), nullable=False),
+        Index('ix_{}_id'.format(name), 'id'),
+    ])
+
+
+#---------------------------------------------------------------------------------
+# Cascading delete
+#---------------------------------------------------------------------------------
+
+class CascadeDelete(object):
+    """
+    Deletes rows of `model` (venues, artists) with everything that hangs off
+    them. The shows and genres go with them through the ON DELETE CASCADE
+    foreign keys, so removing a venue is one DELETE however many shows it had.
+    With archive=True every row goes to its archive table in the same
+    transaction: on postgres each table is moved in one statement,
+    WITH moved AS (DELETE ... RETURNING ...) INSERT ... SELECT FROM moved, so
+    its rows are read once; elsewhere they are first copied, one
+    INSERT ... SELECT per table, then deleted.
+
+    `children` are (model, foreign key column) pairs of the rows that cascade.
+    `archives` maps a table name to its archive table.
+    `deleting(ids)` is called first, on both paths, while the rows are all
+    still there, for what the ORM events cannot see (counters on the other
+    side, cache tags). It must leave the rows going as they are, so they are
+    archived as they were.
+    """
+
+    def __init__(self, db, model, children, archives, deleting=None):
+        self.db = db
+        self.model = model
+        self.children = children
+        self.archives = archives
+        self.deleting = deleting
+
+    def tables(self, ids):
+        # (table, where) of the rows going, the children first
+        tables = [(child.__table__, fk.in_(ids)) for child, fk in self.children]
+        return tables + [(self.model.__table__, self.model.id.in_(ids))]
+
+    def archive(self, ids, now):
+        session = self.db.session
+        for table, where in self.tables(ids):
+            archive = self.archives[table.name]
+            names = [column.name for column in table.columns]
+            session.execute(archive.insert().from_select(
+                names + ['archived_at'],
+                select(list(table.columns) + [literal(now, DateTime(timezone=True))]).where(where)
+            ))
+
+    def move(self, ids, now):
+        # postgres only: deletes and archives each table in one statement,
+        # returns how many of the ids existed
+        session = self.db.session
+        count = 0
+        for table, where in self.tables(ids):
+            archive = self.archives[table.name]
+            names = [column.name for column in table.columns]
+            moved = table.delete().where(where).returning(*table.columns).cte('moved')
+            count = session.execute(archive.insert().from_select(
+                names + ['archived_at'],
+                select([moved.c[name] for name in names] + [literal(now, DateTime(timezone=True))])
+            )).rowcount
+        return count
+
+    def delete(self, ids, archive=False):
+        '''
+        deletes the rows with these ids and their children, returns how many
+        of the ids existed. Does not commit.
+        '''
+        session = self.db.session
+        now = datetime.datetime.now(tz=pytz.UTC)
+        if self.deleting is not None:
+            self.deleting(ids)
+        if archive and session.bind.dialect.name == 'postgresql':
+            return self.move(ids, now)
+        if archive:
+            self.archive(ids, now)
+        if session.bind.dialect.name == 'sqlite':
+            # sqlite leaves foreign keys unenforced unless asked, do the cascade here
+            for child, fk in self.children:
+                session.execute(child.__table__.delete().where(fk.in_(ids)))
+        return session.execute(self.model.__table__.delete().where(self.model.id.in_(ids))).rowcount
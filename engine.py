@@ -0,0 +1,63 @@
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, orm
+from sqlalchemy.pool import NullPool
+from routing import RoutingSession
+
+
+#---------------------------------------------------------------------------------
+# Engine options
+#---------------------------------------------------------------------------------
+
+def engine_options(config, driver='psycopg2'):
+    '''
+    create_engine() options for a postgres database from the DB_* settings,
+    see config.py.
+    '''
+    options = {}
+    if driver == 'psycopg2':
+        # batches executemany inserts into multi row VALUES (bulk import)
+        options['executemany_mode'] = 'values'
+    if config['DB_PGBOUNCER']:
+        # PgBouncer already pools the server connections, a local pool on
+        # top would only hold them idle
+        options['poolclass'] = NullPool
+        return options
+
+    options.update(
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+        pool_recycle=config['DB_POOL_RECYCLE'],
+        pool_pre_ping=config['DB_POOL_PRE_PING'],
+    )
+    if config['DB_STATEMENT_TIMEOUT']:
+        options['connect_args'] = {'options': '-c statement_timeout={}'.format(config['DB_STATEMENT_TIMEOUT'])}
+    return options
+
+def set_statement_timeout(engine, timeout):
+    # SET LOCAL lasts until the end of the transaction, which is all a
+    # transaction mode PgBouncer connection is ours for
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        connection.execute('SET LOCAL statement_timeout = {:d}'.format(timeout))
+
+
+class TunedSQLAlchemy(SQLAlchemy):
+    """ Flask-SQLAlchemy with the pool and timeouts of postgres engines taken
+    from the DB_* settings, and sessions that can read from replicas """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        super(TunedSQLAlchemy, self).apply_driver_hacks(app, sa_url, options)
+        dialect = sa_url.get_dialect()
+        if dialect.name == 'postgresql':
+            options.update(engine_options(app.config, dialect.driver))
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super(TunedSQLAlchemy, self).create_engine(sa_url, engine_opts)
+        config = self.get_app().config
+        if engine.dialect.name == 'postgresql' and config['DB_PGBOUNCER'] and config['DB_STATEMENT_TIMEOUT']:
+            set_statement_timeout(engine, config['DB_STATEMENT_TIMEOUT'])
+        return engine
@@ -0,0 +1,110 @@
+import io
+import csv
+import json
+import datetime
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+#---------------------------------------------------------------------------------
+# Encoders
+#---------------------------------------------------------------------------------
+
+def plain(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+def encode_csv(names, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for rows in chunks:
+        writer.writerows([[plain(v) for v in row] for row in rows])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def encode_jsonl(names, chunks):
+    for rows in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(names, [plain(v) for v in row])), separators=(',', ':')) + '\n'
+            for row in rows
+        )
+
+def encode_columns(names, chunks):
+    # one JSON object of column arrays per chunk, loads straight into a data frame
+    for rows in chunks:
+        columns = dict((name, [plain(row[i]) for row in rows]) for i, name in enumerate(names))
+        yield json.dumps(columns, separators=(',', ':')) + '\n'
+
+def encode_parquet(names, chunks):
+    # one row group per chunk, written out as soon as it is encoded.
+    # the schema comes from the first chunk, so an empty export is an empty file
+    sink = io.BytesIO()
+    writer = None
+    for rows in chunks:
+        table = pyarrow.Table.from_pydict(dict((name, [row[i] for row in rows]) for i, name in enumerate(names)))
+        if writer is None:
+            writer = pyarrow.parquet.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    if writer is not None:
+        writer.close()
+    yield sink.getvalue()
+
+# format -> (encoder, mimetype)
+formats = {
+    'csv': (encode_csv, 'text/csv'),
+    'jsonl': (encode_jsonl, 'application/x-ndjson'),
+    'columns': (encode_columns, 'application/x-ndjson'),
+}
+if pyarrow is not None:
+    formats['parquet'] = (encode_parquet, 'application/vnd.apache.parquet')
+
+
+#---------------------------------------------------------------------------------
+# Exporter
+#---------------------------------------------------------------------------------
+
+class Exporter(object):
+    """
+    Streams every row of a table in id order, `chunk_size` rows at a time.
+    Rows are read with yield_per, a server side cursor on postgres, and encoded
+    as they arrive, so memory does not grow with the table. An interrupted
+    export resumes with `after_id`, the last id it wrote.
+    """
+
+    def __init__(self, db, model, chunk_size=1000):
+        self.db = db
+        self.model = model
+        self.chunk_size = chunk_size
+        self.columns = list(model.__table__.columns)
+
+    @property
+    def names(self):
+        return [column.name for column in self.columns]
+
+    def chunks(self, after_id=None):
+        query = self.db.session.query(*self.columns)
+        if after_id is not None:
+            query = query.filter(self.model.id > after_id)
+        rows = []
+        for row in query.order_by(self.model.id).yield_per(self.chunk_size):
+            rows.append(row)
+            if len(rows) >= self.chunk_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+    def stream(self, format, after_id=None):
+        # yields the export as str (bytes for parquet) pieces
+        encode, mimetype = formats[format]
+        return encode(self.names, self.chunks(after_id))
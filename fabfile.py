@@ -4,10 +4,18 @@ from fabric.contrib.console import confirm
 # prepare for deployment
 
 
-def test():
+# the tests, then the benchmark suite on a fresh synthetic database, the volume of the
+# baseline in bench/baselines/routes.json. It gates on statement counts and errors, the
+# latencies only compare on the machine of the baseline: fab test:latency=yes there
+BENCH_DB = "DATABASE_URL=sqlite:////tmp/fyyur-bench.sqlite"
+
+
+def test(latency=False):
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m pytest -q tests && "
+            + BENCH_DB + " python bench/seed.py --venues 1000 --artists 5000 --shows 100000 --reset"
+            " && " + BENCH_DB + " python bench/suite.py" + (" --latency" if latency else ""), capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
@@ -40,7 +48,7 @@ def heroku():
 
 def heroku_test():
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run flask check-query-plans && heroku run flask check-show-counters"
     )
 
 
@@ -0,0 +1,51 @@
+from flask import _app_ctx_stack
+try:
+    import gevent
+    from gevent import monkey
+except ImportError:
+    gevent = None
+
+
+#---------------------------------------------------------------------------------
+# Cooperative serving
+#---------------------------------------------------------------------------------
+# Served by gevent workers (FYYUR_WORKER_CLASS=gevent, see gunicorn.conf.py),
+# every request runs in a greenlet and psycopg2 is made asynchronous by
+# psycogreen: a worker waiting on postgres switches to another request
+# instead of blocking, so one worker keeps many slow reads in flight.
+
+def patch_psycopg():
+    # psycopg2 waits on its socket through gevent, called once per worker
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+def cooperative():
+    return gevent is not None and monkey.is_module_patched('socket')
+
+def concurrently(db, *calls):
+    '''
+    runs the calls, which query through db.session, at the same time and
+    returns their results in order. Each call gets its own session (so its
+    own connection) and shares the request's app context (g). The request's
+    own session ends its transaction first: a connection held while waiting
+    on the calls' would make a page need one more than it uses, and a busy
+    worker could drain the pool with every request waiting on another.
+    Outside gevent they simply run one after the other.
+    '''
+    if not cooperative() or len(calls) < 2:
+        return [call() for call in calls]
+
+    db.session.commit()
+    app_context = _app_ctx_stack.top
+
+    def run(call):
+        with app_context:
+            try:
+                return call()
+            finally:
+                # sessions are scoped per greenlet, give the connection back
+                db.session.remove()
+
+    greenlets = [gevent.spawn(run, call) for call in calls]
+    gevent.joinall(greenlets, raise_error=True)
+    return [greenlet.value for greenlet in greenlets]
@@ -0,0 +1,61 @@
+# gunicorn settings, read from the working directory:
+#   gunicorn
+# FYYUR_WORKER_CLASS=gevent serves every worker's requests cooperatively,
+# see green.py
+import os
+import shutil
+import itertools
+import tempfile
+import multiprocessing
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('FYYUR_BIND', '0.0.0.0:8000')
+worker_class = os.environ.get('FYYUR_WORKER_CLASS', 'sync')
+
+# a sync worker idles while it waits on the database, so there are more of
+# them than cores. a gevent worker keeps its core busy on its own
+cores = multiprocessing.cpu_count()
+workers = int(os.environ.get('FYYUR_WORKERS', cores if worker_class == 'gevent' else cores * 2 + 1))
+# requests in flight per gevent worker, keep it near the pool size
+# (DB_POOL_SIZE + DB_MAX_OVERFLOW) so they do not queue on connections
+worker_connections = int(os.environ.get('FYYUR_WORKER_CONNECTIONS', 30))
+
+# import and warm the app once in the master, the workers are forked from it
+preload_app = os.environ.get('FYYUR_PRELOAD', '1') == '1'
+
+# every worker keeps its metrics in files here, /metrics adds them up (see
+# metrics.py). set before the app is loaded, emptied of the previous run's
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'fyyur-metrics'))
+os.environ.setdefault('prometheus_multiproc_dir', metrics_dir)
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+if worker_class == 'gevent':
+    # before the app is preloaded, so its locks and sockets are cooperative too
+    from gevent import monkey
+    monkey.patch_all()
+    import green
+    green.patch_psycopg()
+
+
+def pre_fork(server, worker):
+    # the lowest free slot, reused by the worker that replaces this one,
+    # names the worker's log file (see LOG_FILE in config.py)
+    taken = set(getattr(other, 'slot', None) for other in server.WORKERS.values())
+    worker.slot = next(slot for slot in itertools.count() if slot not in taken)
+
+
+def post_fork(server, worker):
+    os.environ['FYYUR_WORKER'] = str(worker.slot)
+    if preload_app:
+        import wsgi
+        wsgi.after_fork()
+
+
+def child_exit(server, worker):
+    # the live gauges (connections in use) stop counting a dead worker
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid, metrics_dir)
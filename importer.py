@@ -0,0 +1,213 @@
+import csv
+import json
+from werkzeug.datastructures import MultiDict
+from wtforms import BooleanField, SelectMultipleField
+from wtforms.fields.core import UnboundField
+from sqlalchemy.exc import DBAPIError
+
+
+#---------------------------------------------------------------------------------
+# Readers
+#---------------------------------------------------------------------------------
+
+def read_rows(stream, format):
+    '''
+    yields (line number, row dict) from a text stream of CSV (with a header
+    line) or JSON Lines, one row at a time so the file is never held in memory.
+    A line that is not valid JSON yields (line number, None).
+    '''
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError('unknown import format {!r}'.format(format))
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+#---------------------------------------------------------------------------------
+# Validation
+#---------------------------------------------------------------------------------
+
+field_classes = {}
+
+def form_fields(form_class):
+    # (name, field class) of every field the form declares, looked up once
+    if form_class not in field_classes:
+        field_classes[form_class] = [
+            (name, getattr(form_class, name).field_class) for name in dir(form_class)
+            if isinstance(getattr(form_class, name), UnboundField)
+        ]
+    return field_classes[form_class]
+
+def form_data(form_class, row):
+    # a row as the form would have posted it: lists become repeated fields
+    # (CSV cells separated by ';'), true booleans become a checked box
+    data = MultiDict()
+    for name, field_class in form_fields(form_class):
+        value = row.get(name)
+        if value is None or value == '':
+            continue
+        if field_class is BooleanField:
+            if value is True or str(value).strip().lower() in ('1', 'y', 'yes', 'true', 'on'):
+                data.add(name, 'y')
+        elif field_class is SelectMultipleField:
+            values = value if isinstance(value, list) else str(value).split(';')
+            for item in values:
+                if str(item).strip():
+                    data.add(name, str(item).strip())
+        else:
+            data.add(name, str(value))
+    return data
+
+def validate(form_class, row):
+    # returns (form data, None) or (None, {field: [errors]}), with the same
+    # rules as the form pages
+    form = form_class(formdata=form_data(form_class, row), meta={'csrf': False})
+    if form.validate():
+        return form.data, None
+    return None, form.errors
+
+
+#---------------------------------------------------------------------------------
+# Importer
+#---------------------------------------------------------------------------------
+
+class Importer(object):
+    """
+    Bulk loads rows of one kind (venues, artists or shows) into `model`.
+    Rows are validated with `form`, then inserted a batch at a time with one
+    executemany per table and one commit per batch. A row that fails
+    validation, references a missing row or breaks a constraint is reported
+    with its line number and skipped, the rest of its batch still goes in.
+
+    `values(data)` turns validated form data into the model's column values.
+    `key` is a unique set of columns, used to find the ids of the rows a batch
+    inserted (executemany returns none) so their genres can follow.
+    `references` maps a form field to the model its value must be an id of.
+    `inserted(rows)` is called with the column values of every batch, before
+    its commit, for whatever the rows derive (counters, cache tags).
+    """
+
+    def __init__(self, db, form, model, values, key=None, genre_model=None, genre_fk=None,
+            references=None, inserted=None):
+        self.db = db
+        self.form = form
+        self.model = model
+        self.values = values
+        self.key = key
+        self.genre_model = genre_model
+        self.genre_fk = genre_fk
+        self.references = references or {}
+        self.inserted = inserted
+
+    def run(self, rows, batch_size=1000):
+        '''
+        imports the (line number, row) pairs of `rows`, returns a report
+        {"rows": n, "inserted": n, "errors": [{"line": n, "errors": {...}}]}
+        '''
+        report = {"rows": 0, "inserted": 0, "errors": []}
+        for batch in batches(rows, batch_size):
+            report["rows"] += len(batch)
+            report["inserted"] += self.load(batch, report["errors"])
+        report["errors"].sort(key=lambda error: error["line"])
+        return report
+
+    def load(self, batch, errors):
+        valid = []
+        for line, row in batch:
+            if row is None:
+                errors.append({"line": line, "errors": {"row": ["Not a JSON object."]}})
+                continue
+            data, invalid = validate(self.form, row)
+            if invalid:
+                errors.append({"line": line, "errors": invalid})
+            else:
+                valid.append((line, data))
+        valid = self.check_references(valid, errors)
+        if not valid:
+            return 0
+
+        session = self.db.session
+        try:
+            rows = self.insert(valid, errors)
+            if rows and self.genre_model is not None:
+                self.insert_genres(rows)
+            if rows and self.inserted is not None:
+                self.inserted([values for line, values, genres in rows])
+            session.commit()
+        except:
+            session.rollback()
+            raise
+        return len(rows)
+
+    def check_references(self, valid, errors):
+        # one query per referenced table for the whole batch
+        for field, model in self.references.items():
+            wanted = set(int(data[field]) for line, data in valid if str(data[field]).isdigit())
+            found = set(row[0] for row in self.db.session.query(model.id).filter(model.id.in_(wanted))) if wanted else set()
+            kept = []
+            for line, data in valid:
+                if str(data[field]).isdigit() and int(data[field]) in found:
+                    kept.append((line, data))
+                else:
+                    errors.append({"line": line, "errors": {field: ['No {} with this id.'.format(model.__tablename__)]}})
+            valid = kept
+        return valid
+
+    def insert(self, valid, errors):
+        # the whole batch in one executemany, and only if a row breaks a
+        # constraint, row by row to find which ones
+        table = self.model.__table__
+        session = self.db.session
+        rows = [(line, self.values(data), data.get('genres') or []) for line, data in valid]
+        try:
+            with session.begin_nested():
+                session.execute(table.insert(), [values for line, values, genres in rows])
+            return rows
+        except DBAPIError:
+            pass
+
+        kept = []
+        for line, values, genres in rows:
+            try:
+                with session.begin_nested():
+                    session.execute(table.insert(), values)
+                kept.append((line, values, genres))
+            except DBAPIError as e:
+                errors.append({"line": line, "errors": {"row": [str(e.orig).strip().split('\n')[0]]}})
+        return kept
+
+    def insert_genres(self, rows):
+        model = self.model
+        columns = [getattr(model, name) for name in self.key]
+        names = set(values[self.key[0]] for line, values, genres in rows)
+        ids = dict(
+            (tuple(found[1:]), found[0])
+            for found in self.db.session.query(model.id, *columns).filter(columns[0].in_(names))
+        )
+        genre_rows = []
+        for line, values, genres in rows:
+            id = ids[tuple(values[name] for name in self.key)]
+            for genre in sorted(set(genres)):
+                genre_rows.append({'name': genre, self.genre_fk: id})
+        if genre_rows:
+            self.db.session.execute(self.genre_model.__table__.insert(), genre_rows)
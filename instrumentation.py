@@ -0,0 +1,155 @@
+import re
+import time
+from flask import g, request, has_app_context, signals
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+#---------------------------------------------------------------------------------
+# Per request instrumentation
+#---------------------------------------------------------------------------------
+
+# literals of a statement, so "WHERE id = 3" and "WHERE id = 4" count as one
+literals = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+def shape(statement):
+    return ' '.join(literals.sub('?', statement).split())
+
+class RequestStats(object):
+    """ What one request spent in the database and in templates, kept in g.request_stats """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.slowest = (0.0, None)
+        self.shapes = {}
+        self.render_time = 0.0
+        self.renders = []
+        self.db_errors = []
+
+    def executed(self, statement, elapsed):
+        self.statements += 1
+        self.db_time += elapsed
+        if elapsed > self.slowest[0]:
+            self.slowest = (elapsed, statement)
+        if statement.lstrip()[:6].upper() == 'SELECT':
+            key = shape(statement)
+            self.shapes[key] = self.shapes.get(key, 0) + 1
+
+    def repeated(self, threshold):
+        # the same select run again and again, the mark of an N+1 loop
+        return sorted(((count, key) for key, count in self.shapes.items() if count >= threshold), reverse=True)
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+
+class Instrumentation(object):
+    """
+    Counts the SQL statements, database time and template render time of
+    every request, from the cursor events of every engine (primary and
+    replicas) and the template signals of flask (these need blinker).
+
+    Each request gets
+    - a Server-Timing header (db, render, total), read by the browsers'
+      developer tools, when SERVER_TIMING is on,
+    - one record on the `<app>.requests` logger, its `fields` are written
+      out as JSON (see logs.py),
+    - with INSTRUMENT_PANEL on (development), a panel at the bottom of HTML
+      pages that lists the selects run INSTRUMENT_REPEAT_THRESHOLD times or
+      more, N+1 loads the ORM hid in a template or loop.
+    Database errors are counted even when a view swallows them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.logger = app.logger.getChild('requests')
+        self.threshold = app.config['INSTRUMENT_REPEAT_THRESHOLD']
+        event.listen(Engine, 'before_cursor_execute', self.before_execute)
+        event.listen(Engine, 'after_cursor_execute', self.after_execute)
+        event.listen(Engine, 'handle_error', self.failed)
+        if signals.signals_available:
+            signals.before_render_template.connect(self.before_render, app)
+            signals.template_rendered.connect(self.after_render, app)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+
+    #  Collection
+    #  ----------------------------------------------------------------
+
+    def current(self):
+        if has_app_context():
+            return g.get('request_stats')
+        return None
+
+    def start(self):
+        g.request_stats = RequestStats()
+
+    def before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('instrument_started', []).append(time.perf_counter())
+
+    def after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['instrument_started'].pop()
+        stats = self.current()
+        if stats is not None:
+            stats.executed(statement, time.perf_counter() - started)
+
+    def failed(self, context):
+        if context.connection is not None:
+            # after_cursor_execute never comes for a failed statement
+            context.connection.info.pop('instrument_started', None)
+        stats = self.current()
+        if stats is not None:
+            stats.db_errors.append('{}: {}'.format(type(context.original_exception).__name__, context.original_exception))
+
+    def before_render(self, app, template, context):
+        stats = self.current()
+        if stats is not None:
+            stats.renders.append(time.perf_counter())
+
+    def after_render(self, app, template, context):
+        stats = self.current()
+        if stats is not None and stats.renders:
+            stats.render_time += time.perf_counter() - stats.renders.pop()
+
+    #  Reporting
+    #  ----------------------------------------------------------------
+
+    def finish(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        total = stats.total()
+        repeated = stats.repeated(self.threshold)
+        if self.app.config['SERVER_TIMING']:
+            response.headers.add('Server-Timing', 'db;dur={:.1f};desc="{} statements", render;dur={:.1f}, total;dur={:.1f}'.format(
+                stats.db_time * 1000, stats.statements, stats.render_time * 1000, total * 1000))
+        self.logger.info('%s %s %s %.1fms %d statements', request.method, request.path, response.status_code,
+            total * 1000, stats.statements, extra={'fields': {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 2),
+            'db_statements': stats.statements,
+            'db_ms': round(stats.db_time * 1000, 2),
+            'render_ms': round(stats.render_time * 1000, 2),
+            'slowest_ms': round(stats.slowest[0] * 1000, 2),
+            'slowest': stats.slowest[1],
+            'repeated': [{'count': count, 'statement': key} for count, key in repeated],
+            'db_errors': stats.db_errors,
+        }})
+        if self.app.config['INSTRUMENT_PANEL'] and response.mimetype == 'text/html' and not response.is_streamed:
+            self.add_panel(response, stats, total, repeated)
+        return response
+
+    def add_panel(self, response, stats, total, repeated):
+        body = response.get_data(as_text=True)
+        end = body.rfind('</body>')
+        if end < 0:
+            return
+        # straight from the environment, rendering through flask would be instrumented too
+        panel = self.app.jinja_env.get_template('layouts/debug_panel.html').render(
+            stats=stats, total=total, repeated=repeated)
+        response.set_data(body[:end] + panel + body[end:])
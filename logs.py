@@ -0,0 +1,339 @@
+import os
+import copy
+import json
+import time
+import uuid
+import random
+import queue
+import atexit
+import logging
+import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from flask import g, request, has_request_context
+from flask.logging import default_handler
+
+
+#---------------------------------------------------------------------------------
+# Records
+#---------------------------------------------------------------------------------
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, the request tags
+    (request_id, route, db_ms, db_statements), the exception if any, and the
+    `fields` dict passed as extra={'fields': {...}}.
+    """
+
+    tags = ('request_id', 'route', 'db_ms', 'db_statements')
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for tag in self.tags:
+            value = getattr(record, tag, None)
+            if value is not None:
+                entry[tag] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        entry.update(getattr(record, 'fields', None) or {})
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+class RequestTags(logging.Filter):
+    """ Tags the records logged during a request with its id, route and database time so far """
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.route = request.endpoint
+            stats = g.get('request_stats')
+            if stats is not None:
+                record.db_ms = round(stats.db_time * 1000, 2)
+                record.db_statements = stats.statements
+        return True
+
+
+class RequestSampling(logging.Filter):
+    """
+    Picks `rate` of the request records of instrumentation.py for the request
+    sample: their compact entry (route, args, status, latency, statements)
+    goes in `record.sample`. Lets through the records at `level` or above,
+    and the picked ones.
+    """
+
+    def __init__(self, rate, level):
+        logging.Filter.__init__(self)
+        self.rate = rate
+        self.level = level
+
+    def filter(self, record):
+        fields = getattr(record, 'fields', None)
+        if fields is not None and self.rate and random.random() < self.rate:
+            record.sample = {
+                't': round(record.created, 3),
+                'method': fields['method'],
+                'route': fields['endpoint'],
+                'path': fields['path'],
+                'status': fields['status'],
+                'ms': fields['duration_ms'],
+                'queries': fields['db_statements'],
+            }
+            if has_request_context() and request.args:
+                record.sample['args'] = dict((key, values[0] if len(values) == 1 else values)
+                    for key, values in request.args.lists())
+            return True
+        return record.levelno >= self.level
+
+
+#---------------------------------------------------------------------------------
+# Handlers
+#---------------------------------------------------------------------------------
+
+class RotatingFileHandler(TimedRotatingFileHandler):
+    """
+    Rolls the file over at `when` (midnight...) like TimedRotatingFileHandler,
+    and also as soon as it reaches maxBytes. Several rollovers in one period
+    are kept apart as <name>.<date>.1, .2...
+    """
+
+    def __init__(self, filename, when='midnight', backupCount=0, maxBytes=0, **kwargs):
+        TimedRotatingFileHandler.__init__(self, filename, when=when, backupCount=backupCount, **kwargs)
+        self.maxBytes = maxBytes
+
+    def shouldRollover(self, record):
+        if TimedRotatingFileHandler.shouldRollover(self, record):
+            return True
+        if self.maxBytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            return self.stream.tell() >= self.maxBytes
+        return False
+
+    def backups(self):
+        # the rolled over files, oldest first, as (date, number, path): by
+        # date, then by number, so .10 comes after .9
+        prefix = self.baseFilename + '.'
+        found = []
+        for name in os.listdir(os.path.dirname(self.baseFilename)):
+            path = os.path.join(os.path.dirname(self.baseFilename), name)
+            if not path.startswith(prefix):
+                continue
+            stamp, _, n = path[len(prefix):].partition('.')
+            if n and not n.isdigit():
+                continue
+            try:
+                time.strptime(stamp, self.suffix)
+            except ValueError:
+                continue
+            found.append((stamp, int(n or 0), path))
+        return sorted(found)
+
+    def rotation_filename(self, default_name):
+        # after the last file of the period: the backup count may have freed
+        # the lower numbers, and the newest file must not take one of them
+        stamp = default_name[len(self.baseFilename) + 1:]
+        taken = [n for other, n, path in self.backups() if other == stamp]
+        if not taken:
+            return default_name
+        return '{}.{}'.format(default_name, max(taken) + 1)
+
+    def getFilesToDelete(self):
+        backups = self.backups()
+        if len(backups) <= self.backupCount:
+            return []
+        return [path for stamp, n, path in backups[:len(backups) - self.backupCount]]
+
+
+class RequestQueueHandler(QueueHandler):
+    """
+    Puts records on a queue a listener thread writes out, so the request
+    never waits on the disk. When the queue is full records are dropped
+    (and counted) rather than blocking the request.
+    """
+
+    def __init__(self, queue):
+        QueueHandler.__init__(self, queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # the message and traceback are rendered now, their objects may have
+        # changed by the time the listener writes the record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RequestSample(logging.Handler):
+    """
+    Appends the entries RequestSampling picked to `path` as JSON lines (see
+    bench/replay.py), in one write every `size` lines or `seconds`. Runs on
+    the listener thread, like the other file writes.
+    """
+
+    def __init__(self, path, size=100, seconds=10):
+        logging.Handler.__init__(self)
+        self.path = path
+        self.size = size
+        self.seconds = seconds
+        self.buffer = []
+        self.flushed = time.monotonic()
+
+    def filter(self, record):
+        return hasattr(record, 'sample')
+
+    def emit(self, record):
+        self.buffer.append(json.dumps(record.sample, separators=(',', ':')))
+        if len(self.buffer) >= self.size or time.monotonic() - self.flushed >= self.seconds:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.buffer:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(self.buffer) + '\n')
+                self.buffer = []
+            self.flushed = time.monotonic()
+        finally:
+            self.release()
+
+    def idle(self):
+        if time.monotonic() - self.flushed >= self.seconds:
+            self.flush()
+
+
+class Listener(QueueListener):
+    """ QueueListener that also gives its handlers an `idle()` call every
+    `interval` seconds the queue stays empty, so a quiet worker still writes
+    out what its handlers buffered """
+
+    def __init__(self, queue, *handlers, interval=1.0):
+        QueueListener.__init__(self, queue, *handlers, respect_handler_level=True)
+        self.interval = interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, self.interval)
+            except queue.Empty:
+                if not block:
+                    raise
+                for handler in self.handlers:
+                    if hasattr(handler, 'idle'):
+                        handler.idle()
+
+
+#---------------------------------------------------------------------------------
+# Application logging
+#---------------------------------------------------------------------------------
+
+class AppLogging(object):
+    """
+    Sends app.logger (and its children, like the request log of
+    instrumentation.py) as JSON lines to LOG_FILE, through a queue and a
+    listener thread. LOG_FILE may name the `{worker}`: each gunicorn worker
+    writes its own file (see gunicorn.conf.py), as processes cannot safely
+    rotate a shared one. Without LOG_FILE flask's own logging is left alone.
+
+    REQUEST_SAMPLE_FILE gets a sample of the requests, REQUEST_SAMPLE_RATE
+    of them, to replay with bench/replay.py. It is picked in the request and
+    written by the same listener thread, with or without LOG_FILE. Without
+    it the request records go to the sample only, not on to stderr.
+
+    Every response carries its X-Request-ID, taken from the request when
+    the proxy sent one.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.handler = None
+        self.logger = app.logger
+        self.listener = None
+        self.sample = None
+        app.before_request(self.identify)
+        app.after_request(self.echo)
+        self.start()
+        atexit.register(self.stop)
+
+    def start(self):
+        config = self.app.config
+        worker = os.environ.get('FYYUR_WORKER', 'main')
+        handlers = []
+        level = logging.CRITICAL + 1
+        if config['LOG_FILE']:
+            path = config['LOG_FILE'].format(worker=worker)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            file_handler = RotatingFileHandler(path, when=config['LOG_ROTATE_WHEN'], backupCount=config['LOG_BACKUP_COUNT'],
+                maxBytes=config['LOG_MAX_BYTES'], encoding='utf-8', delay=True)
+            file_handler.setFormatter(JSONFormatter())
+            # the request records may be on for the sample alone
+            file_handler.setLevel(config['LOG_LEVEL'])
+            level = file_handler.level
+            handlers.append(file_handler)
+        rate = config['REQUEST_SAMPLE_RATE'] if config['REQUEST_SAMPLE_FILE'] else 0
+        self.sample = None
+        if rate > 0:
+            path = config['REQUEST_SAMPLE_FILE'].format(worker=worker)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.sample = RequestSample(path, config['REQUEST_SAMPLE_BUFFER'])
+            handlers.append(self.sample)
+            self.app.logger.getChild('requests').setLevel(logging.INFO)
+        if not handlers:
+            return
+
+        records = queue.Queue(config['LOG_QUEUE_SIZE'])
+        self.listener = Listener(records, *handlers)
+        self.listener.start()
+        if self.handler is not None:
+            self.logger.removeHandler(self.handler)
+        self.handler = RequestQueueHandler(records)
+        self.handler.addFilter(RequestTags())
+        self.handler.addFilter(RequestSampling(rate, level))
+        if config['LOG_FILE']:
+            self.logger = self.app.logger
+            # flask's stderr handler would write in the request all the same
+            self.app.logger.removeHandler(default_handler)
+            self.app.logger.setLevel(config['LOG_LEVEL'])
+        else:
+            # the sample alone: the request records go to the queue and no
+            # further, the rest of flask's logging is left alone
+            self.logger = self.app.logger.getChild('requests')
+            self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+
+    def stop(self):
+        # writes out what is still queued, and buffered
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            if self.sample is not None:
+                self.sample.flush()
+
+    def after_fork(self):
+        # the listener thread stays behind in the parent, a worker starts its own on its own file
+        self.listener = None
+        self.start()
+
+    def identify(self):
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+    def echo(self, response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
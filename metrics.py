@@ -0,0 +1,106 @@
+import os
+import time
+from flask import g, request, Response
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+try:
+    from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client import multiprocess
+except ImportError:
+    Counter = None
+
+
+#---------------------------------------------------------------------------------
+# Metrics
+#---------------------------------------------------------------------------------
+
+# request latency buckets, in seconds
+buckets = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+def multiprocess_dir():
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.environ.get('prometheus_multiproc_dir')
+
+
+class Metrics(object):
+    """
+    Prometheus metrics, served at /metrics when prometheus_client is installed:
+    - fyyur_request_seconds: latency histogram per route (flask endpoint)
+    - fyyur_requests_total: requests per route and status (304s are ETag hits)
+    - fyyur_db_connections_in_use / fyyur_db_connections_max: pool use
+    - fyyur_page_cache_total: page cache hits and misses
+    - fyyur_submissions_total: create, edit and delete submissions that were
+      saved (ok) or rolled back (error)
+
+    Updating one is a few dict lookups and an add, no lock is shared between
+    workers: under gunicorn (see gunicorn.conf.py) each worker writes its
+    values to its own files in PROMETHEUS_MULTIPROC_DIR, and a scrape of any
+    worker adds up the files of all of them.
+    """
+
+    def __init__(self, app):
+        self.enabled = Counter is not None and app.config['METRICS_ENABLED']
+        if not self.enabled:
+            return
+        self.request_seconds = Histogram('fyyur_request_seconds', 'Request latency', ['endpoint', 'method'], buckets=buckets)
+        self.requests = Counter('fyyur_requests', 'Requests served', ['endpoint', 'method', 'status'])
+        self.connections_in_use = Gauge('fyyur_db_connections_in_use', 'Database connections checked out',
+            multiprocess_mode='livesum')
+        self.connections_max = Gauge('fyyur_db_connections_max', 'Database connections the pools can open',
+            multiprocess_mode='livesum')
+        self.page_cache = Counter('fyyur_page_cache', 'Page cache lookups', ['result'])
+        self.submissions = Counter('fyyur_submissions', 'Create, edit and delete submissions', ['kind', 'action', 'result'])
+
+        config = app.config
+        # the primary and each replica pool, per worker (no pool behind pgbouncer)
+        engines = 1 + len(config['SQLALCHEMY_REPLICA_URIS'])
+        self.capacity = 0 if config['DB_PGBOUNCER'] else engines * (config['DB_POOL_SIZE'] + config['DB_MAX_OVERFLOW'])
+        self.pid = None
+        event.listen(Pool, 'checkout', self.checked_out)
+        event.listen(Pool, 'checkin', self.checked_in)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.add_url_rule('/metrics', 'metrics', self.serve)
+
+    #  Recording
+    #  ----------------------------------------------------------------
+
+    def start(self):
+        if self.pid != os.getpid():
+            # once per worker, a master that preloaded the app holds no connections
+            self.pid = os.getpid()
+            self.connections_max.set(self.capacity)
+        g.metrics_started = time.perf_counter()
+
+    def finish(self, response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'none'
+            self.request_seconds.labels(endpoint, request.method).observe(time.perf_counter() - started)
+            self.requests.labels(endpoint, request.method, response.status_code).inc()
+        return response
+
+    def checked_out(self, dbapi_connection, connection_record, connection_proxy):
+        self.connections_in_use.inc()
+
+    def checked_in(self, dbapi_connection, connection_record):
+        self.connections_in_use.dec()
+
+    def cache_lookup(self, result):
+        # called by PageCache with 'hit' or 'miss'
+        if self.enabled:
+            self.page_cache.labels(result).inc()
+
+    def submitted(self, kind, action, ok):
+        if self.enabled:
+            self.submissions.labels(kind, action, 'ok' if ok else 'error').inc()
+
+    #  Exposition
+    #  ----------------------------------------------------------------
+
+    def serve(self):
+        if multiprocess_dir():
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
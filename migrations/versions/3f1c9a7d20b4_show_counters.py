@@ -0,0 +1,46 @@
+"""maintained upcoming and past show counters on venue and artist
+
+Revision ID: 3f1c9a7d20b4
+Revises: de045bbe8ace
+Create Date: 2026-10-18 18:21:40.095310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d20b4'
+down_revision = 'de045bbe8ace'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    state = op.create_table('show_counter_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rolled_over_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(state.insert().values(id=1, rolled_over_at=sa.func.now()))
+
+    # backfill every counter as of the watermark just written
+    for table, fk in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        op.execute(
+            'UPDATE {table} SET '
+            'upcoming_shows_count = (SELECT count(*) FROM show WHERE show.{fk} = {table}.id '
+            'AND show.date > (SELECT rolled_over_at FROM show_counter_state WHERE id = 1)), '
+            'past_shows_count = (SELECT count(*) FROM show WHERE show.{fk} = {table}.id '
+            'AND show.date < (SELECT rolled_over_at FROM show_counter_state WHERE id = 1))'.format(table=table, fk=fk)
+        )
+
+
+def downgrade():
+    op.drop_table('show_counter_state')
+    for table in ('artist', 'venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,102 @@
+"""on delete cascade from venue and artist, and archive tables
+
+Revision ID: 5d7e0b3a91c6
+Revises: c47d19e2a5f3
+Create Date: 2026-10-18 21:04:12.530417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7e0b3a91c6'
+down_revision = 'c47d19e2a5f3'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table), named as postgres named them
+foreign_keys = (
+    ('show', 'venue_id', 'venue'),
+    ('show', 'artist_id', 'artist'),
+    ('venue_genre', 'venue', 'venue'),
+    ('artist_genre', 'artist', 'artist'),
+)
+
+
+def stamps():
+    return [
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), nullable=False),
+    ]
+
+
+def upgrade():
+    for table, column, referred in foreign_keys:
+        name = '{}_{}_fkey'.format(table, column)
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete='CASCADE')
+
+    op.create_table('venue_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('address', sa.String(length=120), nullable=False),
+    sa.Column('phone', sa.String(length=120), nullable=False),
+    sa.Column('image_link', sa.String(length=500), nullable=False),
+    sa.Column('facebook_link', sa.String(length=120), nullable=False),
+    sa.Column('website_link', sa.String(length=120), nullable=False),
+    sa.Column('seeking_talent', sa.Boolean(), nullable=False),
+    sa.Column('seeking_description', sa.String(length=1200), nullable=True),
+    sa.Column('upcoming_shows_count', sa.Integer(), nullable=False),
+    sa.Column('past_shows_count', sa.Integer(), nullable=False),
+    *stamps()
+    )
+    op.create_table('artist_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('phone', sa.String(length=120), nullable=False),
+    sa.Column('image_link', sa.String(length=500), nullable=False),
+    sa.Column('facebook_link', sa.String(length=120), nullable=True),
+    sa.Column('website_link', sa.String(length=120), nullable=True),
+    sa.Column('seeking_venues', sa.Boolean(), nullable=False),
+    sa.Column('seeking_description', sa.String(length=120), nullable=True),
+    sa.Column('upcoming_shows_count', sa.Integer(), nullable=False),
+    sa.Column('past_shows_count', sa.Integer(), nullable=False),
+    *stamps()
+    )
+    op.create_table('show_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=True),
+    sa.Column('venue_id', sa.Integer(), nullable=True),
+    *stamps()
+    )
+    op.create_table('venue_genre_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('venue', sa.Integer(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(timezone=True), nullable=False)
+    )
+    op.create_table('artist_genre_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('artist', sa.Integer(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(timezone=True), nullable=False)
+    )
+    for table in ('venue', 'artist', 'show', 'venue_genre', 'artist_genre'):
+        op.create_index('ix_{}_archive_id'.format(table), '{}_archive'.format(table), ['id'])
+
+
+def downgrade():
+    for table in ('artist_genre', 'venue_genre', 'show', 'artist', 'venue'):
+        op.drop_index('ix_{}_archive_id'.format(table), table_name='{}_archive'.format(table))
+        op.drop_table('{}_archive'.format(table))
+
+    for table, column, referred in foreign_keys:
+        name = '{}_{}_fkey'.format(table, column)
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'])
@@ -0,0 +1,38 @@
+"""indexes for the show, genre and listing lookups
+
+Revision ID: 8b2e4c61f0a9
+Revises: 3f1c9a7d20b4
+Create Date: 2026-10-18 19:05:12.551304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4c61f0a9'
+down_revision = '3f1c9a7d20b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_venue_id_date', 'show', ['venue_id', 'date'], unique=False)
+    op.create_index('ix_show_date_id', 'show', ['date', 'id'], unique=False)
+    op.create_index('ix_venue_genre_venue', 'venue_genre', ['venue'], unique=False)
+    op.create_index('ix_artist_genre_artist', 'artist_genre', ['artist'], unique=False)
+    op.create_index('ix_venue_name_id', 'venue', ['name', 'id'], unique=False)
+    op.create_index('ix_venue_state_city', 'venue', ['state', 'city'], unique=False)
+    op.create_index('ix_artist_name_id', 'artist', ['name', 'id'], unique=False)
+    op.create_index('ix_artist_state_city', 'artist', ['state', 'city'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artist_state_city', table_name='artist')
+    op.drop_index('ix_artist_name_id', table_name='artist')
+    op.drop_index('ix_venue_state_city', table_name='venue')
+    op.drop_index('ix_venue_name_id', table_name='venue')
+    op.drop_index('ix_artist_genre_artist', table_name='artist_genre')
+    op.drop_index('ix_venue_genre_venue', table_name='venue_genre')
+    op.drop_index('ix_show_date_id', table_name='show')
+    op.drop_index('ix_show_venue_id_date', table_name='show')
@@ -0,0 +1,31 @@
+"""index the lower(city) filter of the faceted search
+
+Revision ID: 9e3b71d4c2a8
+Revises: 5d7e0b3a91c6
+Create Date: 2026-10-18 17:45:02.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3b71d4c2a8'
+down_revision = '5d7e0b3a91c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # no view filters on (state, city): the search compares lower(city)
+    op.drop_index('ix_venue_state_city', table_name='venue')
+    op.drop_index('ix_artist_state_city', table_name='artist')
+    op.create_index('ix_venue_lower_city_state', 'venue', [sa.text('lower(city)'), 'state'], unique=False)
+    op.create_index('ix_artist_lower_city_state', 'artist', [sa.text('lower(city)'), 'state'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artist_lower_city_state', table_name='artist')
+    op.drop_index('ix_venue_lower_city_state', table_name='venue')
+    op.create_index('ix_artist_state_city', 'artist', ['state', 'city'], unique=False)
+    op.create_index('ix_venue_state_city', 'venue', ['state', 'city'], unique=False)
@@ -0,0 +1,26 @@
+"""updated_at version stamps on venue, artist and show
+
+Revision ID: c47d19e2a5f3
+Revises: 8b2e4c61f0a9
+Create Date: 2026-10-18 20:12:37.218844
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47d19e2a5f3'
+down_revision = '8b2e4c61f0a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist', 'show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade():
+    for table in ('show', 'artist', 'venue'):
+        op.drop_column(table, 'updated_at')
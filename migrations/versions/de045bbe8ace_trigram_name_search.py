@@ -0,0 +1,35 @@
+"""trigram indexes for venue and artist name search
+
+Revision ID: de045bbe8ace
+Revises: 
+Create Date: 2026-10-18 17:02:11.412087
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'de045bbe8ace'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the tables themselves predate this migration history, this revision
+    # only adds the pg_trgm indexes used by the name search
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venue_name_trgm', 'venue', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artist_name_trgm', 'artist', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_artist_name_trgm', table_name='artist')
+    op.drop_index('ix_venue_name_trgm', table_name='venue')
@@ -0,0 +1,80 @@
+import base64
+import json
+import datetime
+import dateutil.parser
+from sqlalchemy import and_, or_
+
+
+#---------------------------------------------------------------------------------
+# Cursors
+#---------------------------------------------------------------------------------
+
+def encode_cursor(values):
+    # turn the sort key of a row into an opaque url safe token
+    values = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token, columns):
+    # returns the sort key stored in the token, or None if it is not a valid cursor
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != len(columns):
+        return None
+
+    # datetimes travel as iso strings, parse them back for the comparison
+    for i, column in enumerate(columns):
+        if isinstance(column.type.python_type, type) and issubclass(column.type.python_type, datetime.datetime):
+            try:
+                values[i] = dateutil.parser.isoparse(values[i])
+            except (TypeError, ValueError):
+                return None
+    return values
+
+
+#---------------------------------------------------------------------------------
+# Keyset pagination
+#---------------------------------------------------------------------------------
+
+def after_key(columns, values, reverse=False):
+    # (c1, c2, ...) > (v1, v2, ...) written out so it works on every backend
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        step = column < values[i] if reverse else column > values[i]
+        clauses.append(and_(*(equal + [step])))
+    return or_(*clauses)
+
+def keyset_page(query, columns, key, after=None, before=None, per_page=50):
+    '''
+    returns (rows, prev_cursor, next_cursor) for one page of `query`.
+    `columns` is the sort key ending with a unique column (usually the id),
+    `key` extracts the same values from a result row.
+    The cost of a page does not depend on how deep into the table it is.
+    '''
+    after = decode_cursor(after, columns)
+    before = decode_cursor(before, columns)
+
+    if before is not None:
+        # walk backwards from the cursor, then flip the page back into order
+        rows = query.filter(after_key(columns, before, reverse=True)) \
+            .order_by(*[c.desc() for c in columns]).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        prev_cursor = encode_cursor(key(rows[0])) if has_more and rows else None
+        next_cursor = encode_cursor(key(rows[-1])) if rows else None
+        return rows, prev_cursor, next_cursor
+
+    if after is not None:
+        query = query.filter(after_key(columns, after))
+    rows = query.order_by(*columns).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    prev_cursor = encode_cursor(key(rows[0])) if after is not None and rows else None
+    next_cursor = encode_cursor(key(rows[-1])) if has_more else None
+    return rows, prev_cursor, next_cursor
@@ -0,0 +1,62 @@
+import re
+import uuid
+from sqlalchemy import event
+
+
+#---------------------------------------------------------------------------------
+# Query plans
+#---------------------------------------------------------------------------------
+
+def captured(engine, run):
+    # runs `run()` and returns the (statement, parameters) it sent to `engine`
+    statements = []
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        run()
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    return statements
+
+def explain(engine, statement, parameters):
+    # returns the plan of `statement` as a list of lines, as the database reports it
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if engine.dialect.name == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            return [row[-1] for row in cursor.fetchall()]
+        if engine.dialect.name == 'postgresql':
+            # small tables are cheaper to scan than to look up, so without this the
+            # planner would hide a missing index until the table grows
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute('EXPLAIN ' + statement, parameters)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        connection.rollback()
+        connection.close()
+
+def check_plans(engine, client, checks):
+    '''
+    `checks` are (name, path, table, index) tuples: every statement the page at
+    `path` runs on `table` must reach it through an index, one of them through
+    `index` (a name or a tuple of acceptable names, any index when None).
+    The pages are requested with `client` (a flask test client), so these are
+    the statements the views really run.
+    returns the failures as (name, plan lines).
+    '''
+    failures = []
+    for name, path, table, index in checks:
+        # a path of its own, never a page from the page cache
+        path += '{}plan={}'.format('&' if '?' in path else '?', uuid.uuid4().hex)
+        reads = re.compile(r'\b(FROM|JOIN)\s+"?{}"?(\s|$)'.format(re.escape(table)), re.IGNORECASE)
+        statements = [(s, p) for s, p in captured(engine, lambda: client.get(path)) if reads.search(s)]
+        plan = [line for s, p in statements for line in explain(engine, s, p)]
+        scan = re.compile(r'(Seq Scan on {0}\b)|(^SCAN (TABLE )?{0}\b(?!.*USING (COVERING )?INDEX))'.format(re.escape(table)))
+        names = (index,) if isinstance(index, str) else index or ()
+        uses_index = not names or any(re.search(r'\b{}\b'.format(re.escape(n)), line) for n in names for line in plan)
+        if not statements or not uses_index or any(scan.search(line.strip()) for line in plan):
+            failures.append((name, plan or ['no statement on ' + table]))
+    return failures
@@ -0,0 +1,126 @@
+import time
+import random
+import threading
+import functools
+from flask import g, session, has_app_context
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy.sql.expression import UpdateBase
+
+
+#---------------------------------------------------------------------------------
+# Routing session
+#---------------------------------------------------------------------------------
+
+class RoutingSession(SignallingSession):
+    """
+    Sends the reads of a read only view (see Replicas.reads) to the replica
+    picked for its request. Flushes and INSERT / UPDATE / DELETE statements
+    always go to the primary, and are noted so the request can turn sticky.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('db_replica') if has_app_context() else None
+        if self._flushing or isinstance(clause, UpdateBase):
+            if has_app_context():
+                g.db_wrote = True
+            replica = None
+        if replica is None:
+            return super(RoutingSession, self).get_bind(mapper, clause)
+        return self.app.extensions['sqlalchemy'].db.get_engine(self.app, bind=replica)
+
+
+#---------------------------------------------------------------------------------
+# Replicas
+#---------------------------------------------------------------------------------
+
+class Replicas(object):
+    """
+    Read replicas from SQLALCHEMY_REPLICA_URIS, registered as the binds
+    replica_0, replica_1... so they get the same engine options as the primary.
+
+    A view decorated with `reads` runs its queries on a random replica, unless
+    - the visitor wrote less than REPLICA_STICKY_SECONDS ago, so they read
+      their own writes from the primary, or
+    - every replica lags more than REPLICA_MAX_LAG seconds (or is down).
+    Lags are measured at most every REPLICA_LAG_INTERVAL seconds per worker.
+    """
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self.names = []
+        self.lags = {}
+        self.lock = threading.Lock()
+        config = app.config
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        for i, uri in enumerate(config['SQLALCHEMY_REPLICA_URIS']):
+            name = 'replica_{}'.format(i)
+            binds[name] = uri
+            self.names.append(name)
+        config['SQLALCHEMY_BINDS'] = binds
+        if self.names:
+            app.after_request(self.remember_write)
+
+    #  Lag
+    #  ----------------------------------------------------------------
+
+    def measure(self, name):
+        # seconds the replica is behind, None if it cannot be reached
+        engine = self.db.get_engine(self.app, bind=name)
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name != 'postgresql':
+                    # stand in databases (sqlite tests) never lag
+                    return 0.0
+                return float(connection.execute(
+                    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                    'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+                ).scalar())
+        except Exception:
+            self.app.logger.warning('replica %s unreachable', name, exc_info=True)
+            return None
+
+    def lag(self, name):
+        now = time.time()
+        measured_at, lag = self.lags.get(name, (0, None))
+        if now - measured_at >= self.app.config['REPLICA_LAG_INTERVAL']:
+            # one request per worker pays for the check, the others use the last value
+            with self.lock:
+                measured_at, lag = self.lags.get(name, (0, None))
+                if now - measured_at >= self.app.config['REPLICA_LAG_INTERVAL']:
+                    lag = self.measure(name)
+                    self.lags[name] = (time.time(), lag)
+        return lag
+
+    def pick(self):
+        # a replica fresh enough to read from, or None for the primary
+        # (`in` leaves the session unaccessed, no Vary: Cookie for visitors who never wrote)
+        if not self.names or ('primary_until' in session and session['primary_until'] > time.time()):
+            return None
+        limit = self.app.config['REPLICA_MAX_LAG']
+        lags = [(name, self.lag(name)) for name in self.names]
+        healthy = [name for name, lag in lags if lag is not None and lag <= limit]
+        return random.choice(healthy) if healthy else None
+
+    def staleness(self):
+        # seconds the reads of this request may be behind the primary: a
+        # replica was at most REPLICA_MAX_LAG behind when last measured
+        if g.get('db_replica') is None:
+            return 0
+        return self.app.config['REPLICA_MAX_LAG'] + self.app.config['REPLICA_LAG_INTERVAL']
+
+    #  Views
+    #  ----------------------------------------------------------------
+
+    def reads(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            g.db_replica = self.pick()
+            return view(*args, **kwargs)
+        return wrapper
+
+    def remember_write(self, response):
+        # read your own writes: stick to the primary for a while after one
+        if g.get('db_wrote'):
+            session['primary_until'] = time.time() + self.app.config['REPLICA_STICKY_SECONDS']
+        return response
@@ -0,0 +1,203 @@
+import re
+import threading
+from sqlalchemy import event, func, literal, String
+from sqlalchemy.orm import Session
+
+
+#---------------------------------------------------------------------------------
+# Trigrams
+#---------------------------------------------------------------------------------
+
+def trigrams(text):
+    # same trigrams as postgres pg_trgm: lowercase words padded with two
+    # spaces in front and one behind, non alphanumerics split words
+    grams = set()
+    for word in re.findall(r'\w+', (text or '').lower()):
+        word = '  ' + word + ' '
+        for i in range(len(word) - 2):
+            grams.add(word[i:i + 3])
+    return grams
+
+def contains(column, term):
+    # case insensitive `term in column`, % and _ in the term match themselves
+    # like they do in TrigramIndex
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.ilike('%' + escaped + '%', escape='\\')
+
+def similarity(a, b):
+    # pg_trgm similarity(): shared trigrams over all trigrams
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / float(len(a | b))
+
+
+class TrigramIndex(object):
+    """ In process trigram index, used when the database has no pg_trgm """
+
+    def __init__(self):
+        self.names = {}
+        self.postings = {}
+
+    def add(self, id, name):
+        self.names[id] = name
+        for gram in trigrams(name):
+            self.postings.setdefault(gram, set()).add(id)
+
+    def search(self, term):
+        # returns the ids whose name contains the term, best match first
+        term = term.lower()
+        # only the trigrams without padding are sure to appear in a name that
+        # contains the term, terms shorter than that have to scan every name
+        inner = [gram for gram in trigrams(term) if ' ' not in gram]
+        if inner:
+            candidates = set.intersection(*[self.postings.get(gram, set()) for gram in inner])
+        else:
+            candidates = self.names.keys()
+
+        hits = [id for id in candidates if term in self.names[id].lower()]
+        hits.sort(key=lambda id: (-similarity(self.names[id], term), self.names[id], id))
+        return hits
+
+
+#---------------------------------------------------------------------------------
+# Name search
+#---------------------------------------------------------------------------------
+
+class NameSearch(object):
+    """
+    Case insensitive partial name search over `model`, returning every hit with
+    its number of upcoming shows (from the maintained counters) in a single query.
+    On postgres the ILIKE filter is served by a pg_trgm GIN index on the name and
+    hits are ranked with similarity(). Other databases (sqlite test runs) use an
+    in process TrigramIndex, rebuilt lazily after any change to `model`.
+    """
+
+    def __init__(self, db, model, counters):
+        self.db = db
+        self.model = model
+        self.counters = counters
+        self.index = None
+        self.lock = threading.Lock()
+
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, self.invalidate)
+        event.listen(Session, 'after_bulk_delete', self.bulk_invalidate)
+        event.listen(Session, 'after_bulk_update', self.bulk_invalidate)
+
+    def invalidate(self, *args):
+        self.index = None
+
+    def bulk_invalidate(self, context):
+        if context.mapper.class_ is self.model:
+            self.index = None
+
+    def memory_index(self):
+        index = self.index
+        if index is None:
+            with self.lock:
+                if self.index is None:
+                    index = TrigramIndex()
+                    for id, name in self.db.session.query(self.model.id, self.model.name):
+                        index.add(id, name)
+                    self.index = index
+                index = self.index
+        return index
+
+    def search(self, term, now):
+        model = self.model
+        upcoming = self.counters.upcoming(model, now)
+        query = self.db.session.query(model.id, model.name, upcoming)
+
+        if self.db.session.bind.dialect.name == 'postgresql':
+            rows = query.filter(contains(model.name, term)) \
+                .order_by(func.similarity(model.name, term).desc(), model.name, model.id).all()
+        else:
+            ids = self.memory_index().search(term)
+            rank = dict((id, i) for i, id in enumerate(ids))
+            rows = sorted(query.filter(model.id.in_(ids)).all(), key=lambda r: rank[r[0]]) if ids else []
+
+        return {
+            "count": len(rows),
+            "data": [{
+                "id": r[0],
+                "name": r[1],
+                "num_upcoming_shows": r[2],
+            } for r in rows]
+        }
+
+
+#---------------------------------------------------------------------------------
+# Faceted search
+#---------------------------------------------------------------------------------
+
+class FacetSearch(object):
+    """
+    Search over `model` by name, genre, city and state, with the number of
+    hits per genre and per state.
+    Each facet is counted with every filter applied except its own, so picking
+    "Jazz" still shows how many jazz hits every state has. All the facet counts
+    and the total come from one UNION ALL of grouped selects.
+    """
+
+    def __init__(self, db, model, genre_model, genre_fk, counters):
+        self.db = db
+        self.model = model
+        self.genre_model = genre_model
+        self.genre_fk = genre_fk
+        self.counters = counters
+
+    def filters(self, term=None, genres=None, city=None, state=None, skip=None):
+        model = self.model
+        clauses = []
+        if term:
+            clauses.append(contains(model.name, term))
+        if genres and skip != 'genre':
+            tagged = self.db.session.query(self.genre_fk).filter(self.genre_model.name.in_(genres))
+            clauses.append(model.id.in_(tagged))
+        if city:
+            clauses.append(func.lower(model.city) == city.lower())
+        if state and skip != 'state':
+            clauses.append(model.state == state)
+        return clauses
+
+    def facets(self, **criteria):
+        model = self.model
+        session = self.db.session
+        total = session.query(
+            literal('total'), literal(None, String), func.count(model.id)
+        ).select_from(model).filter(*self.filters(**criteria))
+        genres = session.query(
+            literal('genre'), self.genre_model.name, func.count(func.distinct(model.id))
+        ).select_from(model).join(self.genre_model, self.genre_fk == model.id) \
+            .filter(*self.filters(skip='genre', **criteria)).group_by(self.genre_model.name)
+        states = session.query(
+            literal('state'), model.state, func.count(model.id)
+        ).select_from(model).filter(*self.filters(skip='state', **criteria)).group_by(model.state)
+
+        result = {"count": 0, "genres": [], "states": []}
+        for facet, value, count in total.union_all(genres, states).all():
+            if facet == 'total':
+                result["count"] = count
+            else:
+                result[facet + 's'].append({"name": value, "count": count})
+        for facet in ("genres", "states"):
+            result[facet].sort(key=lambda f: (-f["count"], f["name"]))
+        return result
+
+    def search(self, now, limit=50, **criteria):
+        model = self.model
+        upcoming = self.counters.upcoming(model, now)
+        rows = self.db.session.query(
+            model.id, model.name, model.city, model.state, upcoming
+        ).filter(*self.filters(**criteria)).order_by(model.name, model.id).limit(limit).all()
+
+        result = self.facets(**criteria)
+        result["data"] = [{
+            "id": r[0],
+            "name": r[1],
+            "city": r[2],
+            "state": r[3],
+            "num_upcoming_shows": r[4],
+        } for r in rows]
+        return result
@@ -0,0 +1,71 @@
+import os
+import sys
+import datetime
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the app reads its settings at import: a primary and a replica stand-in
+# (two sqlite files), and the in process page cache
+scratch = tempfile.mkdtemp(prefix='fyyur-tests-')
+os.environ['FYYUR_ENV'] = 'testing'
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch, 'primary.sqlite')
+os.environ['DATABASE_REPLICA_URLS'] = 'sqlite:///' + os.path.join(scratch, 'replica.sqlite')
+os.environ['PAGE_CACHE'] = 'lru'
+
+import app as fyyur
+
+
+@pytest.fixture
+def fyyur_app(monkeypatch):
+    '''
+    the app module on an empty primary and replica, reading from the
+    primary unless the test allows the replica lag
+    '''
+    with fyyur.app.app_context():
+        for bind in (None, 'replica_0'):
+            engine = fyyur.db.get_engine(fyyur.app, bind=bind)
+            fyyur.db.Model.metadata.drop_all(engine)
+            fyyur.db.Model.metadata.create_all(engine)
+    fyyur.page_cache.backend.clear()
+    fyyur.replicas.lags.clear()
+    fyyur.venue_search.invalidate()
+    fyyur.artist_search.invalidate()
+    monkeypatch.setitem(fyyur.app.config, 'REPLICA_MAX_LAG', -1)
+    yield fyyur
+    with fyyur.app.app_context():
+        fyyur.db.session.remove()
+
+
+def venue_row(id, name, **columns):
+    return dict(dict(id=id, name=name, city='New York', state='NY', address='{} Main Street'.format(id),
+        phone='123-123-1234', image_link='https://example.com/venue.png', facebook_link='https://www.facebook.com/venue',
+        website_link='https://venue.example.com', seeking_talent=False, seeking_description=''), **columns)
+
+def artist_row(id, name, **columns):
+    return dict(dict(id=id, name=name, city='New York', state='NY', phone='123-123-{:04}'.format(id),
+        image_link='https://example.com/artist.png', facebook_link='https://www.facebook.com/artist',
+        website_link='https://artist.example.com', seeking_venues=False, seeking_description=''), **columns)
+
+def seed(fyyur, venues):
+    '''
+    venues (with ids from 1) in a few areas, each with a past and an upcoming
+    show of its own artist. Venue 1 and artist 1 also get a show with every
+    other artist and venue, their pages grow too.
+    '''
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with fyyur.app.app_context():
+        db = fyyur.db
+        for model in (fyyur.Show, fyyur.VenueGenre, fyyur.ArtistGenre, fyyur.Venue, fyyur.Artist):
+            db.session.execute(model.__table__.delete())
+        db.session.execute(fyyur.Venue.__table__.insert(),
+            [venue_row(i, 'Venue {}'.format(i), city='City {}'.format(i % 3)) for i in range(1, venues + 1)])
+        db.session.execute(fyyur.Artist.__table__.insert(), [artist_row(i, 'Artist {}'.format(i)) for i in range(1, venues + 1)])
+        db.session.execute(fyyur.VenueGenre.__table__.insert(), [{'venue': i, 'name': 'Jazz'} for i in range(1, venues + 1)])
+        db.session.execute(fyyur.Show.__table__.insert(), [{'venue_id': i, 'artist_id': i, 'date': now + datetime.timedelta(days=days)}
+            for i in range(1, venues + 1) for days in (-10, 10)]
+            + [{'venue_id': 1, 'artist_id': i, 'date': now + datetime.timedelta(days=20, hours=i)} for i in range(2, venues + 1)]
+            + [{'venue_id': i, 'artist_id': 1, 'date': now - datetime.timedelta(days=20, hours=i)} for i in range(2, venues + 1)])
+        db.session.commit()
+    fyyur.page_cache.backend.clear()
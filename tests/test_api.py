@@ -0,0 +1,101 @@
+import pytest
+from conftest import seed
+
+
+@pytest.fixture
+def api(fyyur_app):
+    seed(fyyur_app, 7)
+    with fyyur_app.app.app_context():
+        fyyur_app.show_counters.check(repair=True)
+    return fyyur_app.app.test_client()
+
+def fetched(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    return response.get_json()
+
+def walk(client, path, link):
+    '''the pages from path on, following the link ('next' or 'prev') to the end'''
+    pages = []
+    while path:
+        body = fetched(client, path)
+        pages.append(body['data'])
+        path = body['paging'][link]
+    return pages
+
+
+@pytest.mark.parametrize('path, ids', [
+    ('/api/v1/artists', lambda artist: artist['id']),
+    ('/api/v1/venues', None),
+    ('/api/v1/shows', lambda show: (show['venue_id'], show['artist_id'], show['start_time'])),
+])
+def test_the_links_walk_every_row_once(api, path, ids):
+    if ids is None:
+        # venues are paged by name, then grouped by area within the page
+        def rows(page):
+            return sorted(venue['id'] for area in page for venue in area['venues'])
+        def joined(pages):
+            return sorted(sum(pages, []))
+    else:
+        def rows(page):
+            return [ids(row) for row in page]
+        def joined(pages):
+            return sum(pages, [])
+    whole = rows(fetched(api, path + '?per_page=100')['data'])
+    assert len(whole) > 3
+    assert len(set(whole)) == len(whole)
+
+    pages = walk(api, path + '?per_page=3', 'next')
+    assert [len(rows(page)) for page in pages[:-1]] == [3] * (len(pages) - 1)
+    assert joined([rows(page) for page in pages]) == whole
+
+    # and back again from the last page
+    last = fetched(api, path + '?per_page=3')
+    while last['paging']['next']:
+        last = fetched(api, last['paging']['next'])
+    assert last['paging']['prev']
+    back = walk(api, last['paging']['prev'], 'prev')
+    assert joined([rows(page) for page in reversed(back)] + [rows(last['data'])]) == whole
+
+def test_first_and_last_pages_have_no_link_out(api):
+    only = fetched(api, '/api/v1/artists?per_page=100')
+    assert only['paging'] == {"prev": None, "next": None}
+    first = fetched(api, '/api/v1/artists?per_page=2')
+    assert first['paging']['prev'] is None
+    assert 'per_page=2' in first['paging']['next']
+
+def test_fields_select_the_keys(api):
+    body = fetched(api, '/api/v1/artists?fields=name&per_page=2')
+    assert body['data'] == [{"name": "Artist 1"}, {"name": "Artist 2"}]
+    # the selection carries over to the next page
+    assert 'fields=name' in body['paging']['next']
+    assert list(fetched(api, body['paging']['next'])['data'][0]) == ['name']
+
+    body = fetched(api, '/api/v1/venues?fields=id,num_upcoming_shows&per_page=100')
+    venues = [venue for area in body['data'] for venue in area['venues']]
+    assert all(set(venue) == {'id', 'num_upcoming_shows'} for venue in venues)
+    assert dict((v['id'], v['num_upcoming_shows']) for v in venues)[1] == 7
+
+    shows = fetched(api, '/api/v1/shows?fields=artist_id,start_time')['data']
+    assert shows and all(set(show) == {'artist_id', 'start_time'} for show in shows)
+
+    venue = fetched(api, '/api/v1/venues/2?fields=id,name,upcoming_shows_count')['data']
+    assert venue == {"id": 2, "name": "Venue 2", "upcoming_shows_count": 1}
+    artist = fetched(api, '/api/v1/artists/1?fields=name,past_shows_count,nope')['data']
+    assert artist == {"name": "Artist 1", "past_shows_count": 7}
+
+@pytest.mark.parametrize('path, error', [
+    ('/api/v1/venues/999', 'venue not found'),
+    ('/api/v1/artists/999', 'artist not found'),
+    ('/api/v1/artists/999?fields=name', 'artist not found'),
+])
+def test_missing_rows_are_404(api, path, error):
+    response = api.get(path)
+    assert response.status_code == 404
+    assert response.mimetype == 'application/json'
+    assert response.get_json() == {"error": error}
+
+def test_unknown_endpoints_are_404(api):
+    assert api.get('/api/v1/shows/1').status_code == 404
+    assert api.get('/api/v1/venues/abc').status_code == 404
@@ -0,0 +1,70 @@
+import datetime
+import pytest
+from conftest import seed
+
+
+@pytest.fixture
+def counted(fyyur_app):
+    '''
+    3 venues and artists (see seed) with exact counters. Venue 1 has 3
+    upcoming shows and 1 past, venues 2 and 3 have 1 upcoming and 2 past.
+    Artist 1 is the other way round, artists 2 and 3 have 2 upcoming and 1 past.
+    '''
+    seed(fyyur_app, 3)
+    with fyyur_app.app.app_context():
+        fyyur_app.show_counters.check(repair=True)
+    return fyyur_app
+
+def counters(fyyur, model, id):
+    with fyyur.app.app_context():
+        row = fyyur.db.session.query(model.upcoming_shows_count, model.past_shows_count).filter(model.id == id).one()
+        fyyur.db.session.remove()
+    return tuple(row)
+
+def mismatches(fyyur):
+    with fyyur.app.app_context():
+        return fyyur.show_counters.check()
+
+
+def test_check_finds_and_repairs_a_drift(counted):
+    with counted.app.app_context():
+        counted.db.session.execute(counted.Venue.__table__.update().where(counted.Venue.id == 2).values(upcoming_shows_count=7))
+        counted.db.session.commit()
+        assert counted.show_counters.check() == [('venue', 2, 'upcoming_shows_count', 7, 1)]
+        assert counted.show_counters.check(repair=True) == [('venue', 2, 'upcoming_shows_count', 7, 1)]
+    assert mismatches(counted) == []
+    assert counters(counted, counted.Venue, 2) == (1, 2)
+
+def test_created_show_is_counted(counted):
+    start = datetime.datetime.utcnow() + datetime.timedelta(days=5)
+    counted.app.test_client().post('/shows/create', data={
+        'artist_id': '2', 'venue_id': '2', 'start_time': start.strftime('%Y-%m-%d %H:%M:%S')})
+    assert counters(counted, counted.Venue, 2) == (2, 2)
+    assert counters(counted, counted.Artist, 2) == (3, 1)
+    assert mismatches(counted) == []
+
+@pytest.mark.parametrize('archive', [False, True])
+def test_deleted_venue_uncounts_its_shows(counted, monkeypatch, archive):
+    monkeypatch.setitem(counted.app.config, 'ARCHIVE_DELETES', archive)
+    counted.app.test_client().post('/venues/1')
+    assert counters(counted, counted.Artist, 1) == (0, 2)
+    assert counters(counted, counted.Artist, 2) == (1, 1)
+    assert counters(counted, counted.Artist, 3) == (1, 1)
+    assert mismatches(counted) == []
+
+def test_rollover_moves_started_shows_to_past(counted):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with counted.app.app_context():
+        # counters exact 15 days ago: the shows of 10 days ago were still upcoming
+        counted.db.session.execute(counted.ShowCounterState.__table__.update().values(
+            rolled_over_at=now - datetime.timedelta(days=15)))
+        counted.db.session.commit()
+        counted.show_counters.check(repair=True)
+    assert counters(counted, counted.Venue, 2) == (2, 1)
+
+    with counted.app.app_context():
+        assert counted.show_counters.rollover(now) == 3
+        assert counted.show_counters.rollover(now) == 0
+    assert counters(counted, counted.Venue, 2) == (1, 2)
+    assert counters(counted, counted.Artist, 1) == (1, 3)
+    assert mismatches(counted) == []
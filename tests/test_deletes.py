@@ -0,0 +1,47 @@
+import pytest
+from conftest import seed
+
+
+@pytest.fixture
+def archiving(fyyur_app, monkeypatch):
+    # see tests/test_counters.py for the counters of the seed
+    seed(fyyur_app, 3)
+    with fyyur_app.app.app_context():
+        fyyur_app.show_counters.check(repair=True)
+    monkeypatch.setitem(fyyur_app.app.config, 'ARCHIVE_DELETES', True)
+    return fyyur_app
+
+def archived(fyyur, table, *columns):
+    with fyyur.app.app_context():
+        archive = fyyur.archives[table]
+        rows = fyyur.db.session.execute(archive.select().order_by(*[archive.c[c] for c in columns])).fetchall()
+        fyyur.db.session.remove()
+    return [tuple(row[c] for c in columns) for row in rows], [row['archived_at'] for row in rows]
+
+
+def test_deleted_venue_is_archived_as_it_was(archiving):
+    archiving.app.test_client().post('/venues/1')
+
+    venues, stamps = archived(archiving, 'venue', 'id', 'name', 'upcoming_shows_count', 'past_shows_count')
+    assert venues == [(1, 'Venue 1', 3, 1)]
+    assert all(stamps)
+    shows, _ = archived(archiving, 'show', 'venue_id', 'artist_id')
+    assert shows == [(1, 1), (1, 1), (1, 2), (1, 3)]
+    genres, _ = archived(archiving, 'venue_genre', 'venue', 'name')
+    assert genres == [(1, 'Jazz')]
+    assert archived(archiving, 'artist', 'id')[0] == []
+
+    with archiving.app.app_context():
+        assert archiving.Venue.query.get(1) is None
+        assert archiving.Show.query.filter_by(venue_id=1).count() == 0
+        assert archiving.show_counters.check() == []
+
+def test_deleted_artist_is_archived_as_it_was(archiving):
+    archiving.app.test_client().post('/artists/1')
+
+    artists, _ = archived(archiving, 'artist', 'id', 'name', 'upcoming_shows_count', 'past_shows_count')
+    assert artists == [(1, 'Artist 1', 1, 3)]
+    shows, _ = archived(archiving, 'show', 'artist_id', 'venue_id')
+    assert shows == [(1, 1), (1, 1), (1, 2), (1, 3)]
+    with archiving.app.app_context():
+        assert archiving.show_counters.check() == []
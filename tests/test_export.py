@@ -0,0 +1,52 @@
+import io
+import csv
+import json
+import pytest
+from conftest import seed
+
+
+@pytest.fixture
+def exporting(fyyur_app, monkeypatch):
+    # 5 venues, read 2 at a time so the export spans several chunks
+    seed(fyyur_app, 5)
+    monkeypatch.setattr(fyyur_app.exporters['venues'], 'chunk_size', 2)
+    return fyyur_app
+
+def exported(fyyur, path):
+    response = fyyur.app.test_client().get(path)
+    assert response.status_code == 200
+    return response
+
+
+def test_csv_has_every_column_in_id_order(exporting):
+    response = exported(exporting, '/export/venues')
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=venues.csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row['id'] for row in rows] == ['1', '2', '3', '4', '5']
+    assert list(rows[0]) == exporting.exporters['venues'].names
+    assert rows[0]['name'] == 'Venue 1'
+    assert rows[0]['city'] == 'City 1'
+
+def test_jsonl_is_one_object_per_row(exporting):
+    response = exported(exporting, '/export/venues?format=jsonl')
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['id'] for row in rows] == [1, 2, 3, 4, 5]
+    assert rows[4]['name'] == 'Venue 5'
+    assert rows[4]['updated_at']
+
+@pytest.mark.parametrize('format', ['csv', 'jsonl'])
+def test_an_export_resumes_after_the_last_id(exporting, format):
+    whole = exported(exporting, '/export/venues?format=' + format).get_data(as_text=True).splitlines()
+    rest = exported(exporting, '/export/venues?format={}&after_id=3'.format(format)).get_data(as_text=True).splitlines()
+    if format == 'csv':
+        # the header again, then the rows after id 3
+        assert rest == whole[:1] + whole[4:]
+    else:
+        assert rest == whole[3:]
+
+def test_unknown_tables_and_formats(exporting):
+    client = exporting.app.test_client()
+    assert client.get('/export/nope').status_code == 404
+    assert client.get('/export/venues?format=xml').status_code == 400
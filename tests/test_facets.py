@@ -0,0 +1,86 @@
+import datetime
+import itertools
+import pytest
+from sqlalchemy import event
+from conftest import venue_row
+
+VENUES = [
+    (1, 'Blue Hall', 'New York', 'NY', ['Jazz', 'Blues']),
+    (2, 'Red Room', 'New York', 'NY', ['Jazz']),
+    (3, 'Blue Barn', 'San Francisco', 'CA', ['Jazz', 'Folk']),
+    (4, 'Green Club', 'San Francisco', 'CA', ['Folk']),
+    (5, 'Blue Cellar', 'Austin', 'TX', ['Blues']),
+    (6, 'Quiet Corner', 'Austin', 'TX', []),
+]
+
+
+@pytest.fixture
+def faceted(fyyur_app):
+    with fyyur_app.app.app_context():
+        db = fyyur_app.db
+        for id, name, city, state, genres in VENUES:
+            db.session.add(fyyur_app.Venue(genres=[fyyur_app.VenueGenre(name=genre) for genre in genres],
+                **venue_row(id, name, city=city, state=state)))
+        db.session.commit()
+    return fyyur_app
+
+def search(fyyur, **criteria):
+    with fyyur.app.app_context():
+        result = fyyur.facet_search['venues'].search(datetime.datetime.now(datetime.timezone.utc), **criteria)
+        fyyur.db.session.remove()
+    return result
+
+def expected(term='', genres=(), city='', state=''):
+    # the facets counted by hand: each with every filter but its own
+    def hits(skip=None):
+        return [v for v in VENUES if term.lower() in v[1].lower()
+            and (skip == 'genre' or not genres or set(genres) & set(v[4]))
+            and (not city or v[2].lower() == city.lower())
+            and (skip == 'state' or not state or v[3] == state)]
+    def counted(values):
+        counts = {}
+        for value in values:
+            counts[value] = counts.get(value, 0) + 1
+        return sorted(({"name": k, "count": n} for k, n in counts.items()), key=lambda f: (-f["count"], f["name"]))
+    return {
+        "count": len(hits()),
+        "genres": counted(genre for v in hits('genre') for genre in v[4]),
+        "states": counted(v[3] for v in hits('state')),
+        "data": sorted(v[1] for v in hits()),
+    }
+
+
+def test_each_facet_ignores_its_own_filter(faceted):
+    result = search(faceted, genres=['Jazz'])
+    assert result['count'] == 3
+    # every genre is still offered, the states are those of the jazz venues
+    assert result['genres'] == [{"name": "Jazz", "count": 3}, {"name": "Blues", "count": 2}, {"name": "Folk", "count": 2}]
+    assert result['states'] == [{"name": "NY", "count": 2}, {"name": "CA", "count": 1}]
+
+    result = search(faceted, term='blue', genres=['Jazz'], state='CA')
+    assert [row['name'] for row in result['data']] == ['Blue Barn']
+    assert result['genres'] == [{"name": "Folk", "count": 1}, {"name": "Jazz", "count": 1}]
+    assert result['states'] == [{"name": "CA", "count": 1}, {"name": "NY", "count": 1}]
+
+@pytest.mark.parametrize('term, genres, city, state', itertools.product(
+    ['', 'blue', 'o'], [[], ['Jazz'], ['Blues', 'Folk']], ['', 'austin'], ['', 'NY', 'TX']))
+def test_facet_counts_match_the_rows(faceted, term, genres, city, state):
+    result = search(faceted, term=term, genres=genres, city=city, state=state)
+    wanted = expected(term, genres, city, state)
+    assert result['count'] == wanted['count']
+    assert result['genres'] == wanted['genres']
+    assert result['states'] == wanted['states']
+    assert sorted(row['name'] for row in result['data']) == wanted['data']
+
+def test_facets_are_one_statement(faceted):
+    seen = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+    with faceted.app.app_context():
+        event.listen(faceted.db.engine, 'before_cursor_execute', count)
+        try:
+            faceted.facet_search['venues'].facets(term='blue', genres=['Jazz'], state='NY')
+        finally:
+            event.remove(faceted.db.engine, 'before_cursor_execute', count)
+    assert len(seen) == 1
+    assert 'UNION ALL' in seen[0]
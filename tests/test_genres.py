@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import event
+from conftest import venue_row, artist_row
+
+
+def form_of(row, genres):
+    data = dict((k, v) for k, v in row.items() if k != 'id' and v is not False and v != '')
+    data['genres'] = genres
+    return data
+
+def genre_writes(fyyur, path, data):
+    '''the genre rows the edit inserted and deleted, as (statement, parameters)'''
+    seen = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'genre' in statement.split('(')[0] and statement.split()[0] in ('INSERT', 'DELETE'):
+            seen.append((statement.split()[0], parameters))
+    with fyyur.app.app_context():
+        engine = fyyur.db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        fyyur.app.test_client().post(path, data=data)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    return seen
+
+
+@pytest.mark.parametrize('kind', ['venue', 'artist'])
+def test_an_edit_writes_only_the_genres_that_changed(fyyur_app, kind):
+    owner_model = getattr(fyyur_app, kind.capitalize())
+    genre_model = getattr(fyyur_app, kind.capitalize() + 'Genre')
+    row = (venue_row if kind == 'venue' else artist_row)(1, 'Owner 1')
+    with fyyur_app.app.app_context():
+        fyyur_app.db.session.add(owner_model(genres=[genre_model(name='Jazz'), genre_model(name='Blues')], **row))
+        fyyur_app.db.session.commit()
+        kept = genre_model.query.filter_by(name='Jazz').one().id
+
+    writes = genre_writes(fyyur_app, '/{}s/1/edit'.format(kind), form_of(row, ['Jazz', 'Rock n Roll']))
+
+    assert [statement for statement, parameters in writes] == ['INSERT', 'DELETE']
+    assert 'Rock n Roll' in writes[0][1]
+    with fyyur_app.app.app_context():
+        genres = genre_model.query.order_by(genre_model.name).all()
+        assert [genre.name for genre in genres] == ['Jazz', 'Rock n Roll']
+        # the genre that stayed is the same row
+        assert genres[0].id == kept
@@ -0,0 +1,50 @@
+import os
+import sys
+import subprocess
+import pytest
+
+pytest.importorskip('gevent')
+
+tests = os.path.dirname(os.path.abspath(__file__))
+
+# gevent has to patch the process before anything else is imported, so the
+# requests run in a process of their own: a pool of 2 connections, and more
+# detail pages at once than it has connections
+SCRIPT = '''
+from gevent import monkey
+monkey.patch_all()
+import sys
+import time
+import gevent
+from sqlalchemy.pool import QueuePool
+sys.path.insert(0, {tests!r})
+from conftest import fyyur, seed
+
+fyyur.app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(poolclass=QueuePool, pool_size=2, max_overflow=0, pool_timeout=3)
+fyyur.app.config['REPLICA_MAX_LAG'] = -1
+with fyyur.app.app_context():
+    fyyur.db.drop_all()
+    fyyur.db.create_all()
+seed(fyyur, 3)
+
+def get(path):
+    response = fyyur.app.test_client().get(path)
+    return response.status_code, response.get_data(as_text=True)
+
+started = time.time()
+pages = ['/venues/1?n={{}}'.format(i) for i in range(4)] + ['/artists/1?n={{}}'.format(i) for i in range(4)]
+greenlets = [gevent.spawn(get, path) for path in pages]
+gevent.joinall(greenlets, raise_error=True)
+assert time.time() - started < 3, 'waited on the pool'
+for path, greenlet in zip(pages, greenlets):
+    status, body = greenlet.value
+    assert status == 200, (path, status)
+    assert ('Venue 1' if path.startswith('/venues') else 'Artist 1') in body, path
+print('ok')
+'''
+
+
+def test_detail_pages_share_a_small_pool():
+    result = subprocess.run([sys.executable, '-c', SCRIPT.format(tests=tests)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=60)
+    assert result.returncode == 0 and result.stdout.strip().endswith('ok'), result.stderr[-2000:]
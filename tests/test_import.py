@@ -0,0 +1,68 @@
+import json
+from sqlalchemy import event
+from conftest import seed
+
+VENUES = 'name,city,state,address,phone,image_link,genres,facebook_link,website_link,seeking_talent,seeking_description\n'
+
+
+def imported(fyyur, kind, body, **kwargs):
+    '''the report of the import, and the (statement, executemany) it ran'''
+    seen = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        seen.append((statement, executemany))
+    with fyyur.app.app_context():
+        engine = fyyur.db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        response = fyyur.app.test_client().post('/import/' + kind, data=body, **kwargs)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert response.status_code == 200
+    return response.get_json(), seen
+
+def inserts(seen, table):
+    return [executemany for statement, executemany in seen if statement.startswith('INSERT INTO {} '.format(table))]
+
+
+def test_a_valid_batch_is_one_executemany_per_table(fyyur_app):
+    body = VENUES + ''.join(
+        'Venue {0},New York,NY,{0} Main Street,123-123-1234,https://example.com/v.png,Jazz;Blues,'
+        'https://www.facebook.com/v,https://v.example.com,true,\n'.format(i) for i in range(1, 6))
+    report, seen = imported(fyyur_app, 'venues', body, content_type='text/csv')
+    assert report == {'rows': 5, 'inserted': 5, 'errors': []}
+    assert inserts(seen, 'venue') == [True]
+    assert inserts(seen, 'venue_genre') == [True]
+    with fyyur_app.app.app_context():
+        assert fyyur_app.Venue.query.count() == 5
+        assert fyyur_app.VenueGenre.query.count() == 10
+        assert fyyur_app.show_counters.check() == []
+
+def test_bad_lines_are_reported_and_the_rest_goes_in(fyyur_app):
+    seed(fyyur_app, 2)
+    with fyyur_app.app.app_context():
+        fyyur_app.show_counters.check(repair=True)
+    lines = [
+        {'artist_id': '1', 'venue_id': '2', 'start_time': '2031-01-01 10:00:00'},
+        {'artist_id': '999', 'venue_id': '1', 'start_time': '2031-01-02 10:00:00'},
+        {'artist_id': '2', 'venue_id': '1', 'start_time': 'tomorrow'},
+        {'artist_id': '1', 'venue_id': '1', 'start_time': '2031-01-01 10:00:00'},
+        {'artist_id': '2', 'venue_id': '2', 'start_time': '2031-01-03 10:00:00'},
+    ]
+    body = '\n'.join(json.dumps(line) for line in lines) + '\nnot json\n'
+    report, seen = imported(fyyur_app, 'shows', body)
+
+    assert report['rows'] == 6
+    assert report['inserted'] == 2
+    errors = dict((error['line'], error['errors']) for error in report['errors'])
+    assert sorted(errors) == [2, 3, 4, 6]
+    assert errors[2] == {'artist_id': ['No artist with this id.']}
+    assert list(errors[3]) == ['start_time']
+    # the same artist twice at the same time: the batch failed as a whole,
+    # then went in row by row
+    assert 'unique' in errors[4]['row'][0].lower()
+    assert inserts(seen, 'show') == [True, False, False, False]
+    assert errors[6] == {'row': ['Not a JSON object.']}
+
+    with fyyur_app.app.app_context():
+        assert fyyur_app.Show.query.filter(fyyur_app.Show.date > '2031-01-01').count() == 2
+        assert fyyur_app.show_counters.check() == []
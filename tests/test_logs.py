@@ -0,0 +1,48 @@
+import os
+import json
+import time
+import logging
+import pytest
+from logs import JSONFormatter, RotatingFileHandler
+
+
+@pytest.mark.parametrize('path, loader', [('/venues', 'load_venues_page'), ('/venues/1', 'load_venue_detail')])
+def test_page_errors_are_logged(fyyur_app, monkeypatch, caplog, path, loader):
+    def broken(*args):
+        raise ValueError('not a database error')
+    monkeypatch.setattr(fyyur_app, loader, broken)
+    with caplog.at_level(logging.ERROR, logger=fyyur_app.app.logger.name):
+        fyyur_app.app.test_client().get(path)
+    errors = [record for record in caplog.records if record.levelno == logging.ERROR]
+    assert [record.getMessage() for record in errors] == ['page error on ' + path]
+    assert errors[0].exc_info[0] is ValueError
+
+
+@pytest.mark.parametrize('lines', [18, 39])
+def test_size_rollovers_in_one_day_are_numbered(tmp_path, lines):
+    path = str(tmp_path / 'fyyur.log')
+    handler = RotatingFileHandler(path, backupCount=3, maxBytes=300, encoding='utf-8', delay=True)
+    handler.setFormatter(JSONFormatter())
+    logger = logging.getLogger('fyyur-rotation-test')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        # about 150 bytes a line: a new file every 3 lines
+        for i in range(lines):
+            logger.error('line %02d %s', i, 'x' * 40)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    # <date>, then .1, .2... the backup count keeps the newest 3 of them,
+    # .10 being newer than .9
+    rollovers = (lines - 1) // 3
+    day = path + '.' + time.strftime('%Y-%m-%d', time.localtime(handler.rolloverAt - handler.interval))
+    kept = ['{}.{}'.format(day, n) for n in range(rollovers - 3, rollovers)] + [path]
+    assert sorted(os.listdir(str(tmp_path))) == sorted(os.path.basename(name) for name in kept)
+    files = []
+    for name in kept:
+        with open(name, encoding='utf-8') as f:
+            files.append([json.loads(line)['message'][:7] for line in f])
+    assert files == [['line {:02}'.format(i) for i in range(start, start + 3)]
+        for start in range(3 * (rollovers - 3), lines, 3)]
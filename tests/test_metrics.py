@@ -0,0 +1,79 @@
+import os
+import sys
+import subprocess
+import pytest
+
+pytest.importorskip('prometheus_client')
+from prometheus_client.parser import text_string_to_metric_families
+
+tests = os.path.dirname(os.path.abspath(__file__))
+
+# prometheus_client picks the multiprocess values at import, so every
+# "worker" is a process of its own started with PROMETHEUS_MULTIPROC_DIR set
+WORKER = '''
+import os
+import sys
+sys.path.insert(0, {tests!r})
+from conftest import fyyur
+
+client = fyyur.app.test_client()
+for i in range({requests}):
+    assert client.get('/').status_code == 200
+assert client.get('/nowhere').status_code == 404
+print(os.getpid())
+'''
+
+SCRAPE = '''
+import os
+import sys
+sys.path.insert(0, {tests!r})
+from conftest import fyyur
+from prometheus_client import multiprocess
+
+# the dead workers, as gunicorn's child_exit marks them
+for pid in {dead!r}:
+    multiprocess.mark_process_dead(pid)
+response = fyyur.app.test_client().get('/metrics')
+assert response.status_code == 200
+sys.stdout.write(response.get_data(as_text=True))
+multiprocess.mark_process_dead(os.getpid())
+'''
+
+
+def run(script, directory, **kwargs):
+    # both spellings, as gunicorn.conf.py sets them: older clients read the lower case one
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(directory), prometheus_multiproc_dir=str(directory))
+    result = subprocess.run([sys.executable, '-c', script.format(tests=tests, **kwargs)], env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=60)
+    assert result.returncode == 0, result.stderr[-2000:]
+    return result.stdout
+
+def scraped(directory, dead=()):
+    '''the samples of a scrape, as {(name, sorted labels): value}'''
+    samples = {}
+    for family in text_string_to_metric_families(run(SCRAPE, directory, dead=list(dead))):
+        for sample in family.samples:
+            samples[sample.name, tuple(sorted(sample.labels.items()))] = sample.value
+    return samples
+
+
+def test_a_scrape_adds_up_every_worker(fyyur_app, tmp_path):
+    pids = [int(run(WORKER, tmp_path, requests=requests)) for requests in (3, 5)]
+    samples = scraped(tmp_path)
+
+    requests = ('fyyur_requests_total', (('endpoint', 'index'), ('method', 'GET'), ('status', '200')))
+    assert samples[requests] == 8
+    missing = ('fyyur_requests_total', (('endpoint', 'none'), ('method', 'GET'), ('status', '404')))
+    assert samples[missing] == 2
+    latency = ('fyyur_request_seconds_count', (('endpoint', 'index'), ('method', 'GET')))
+    assert samples[latency] == 8
+
+    # the pool capacity is a live sum: both workers and the scraping process,
+    # until the workers are marked dead
+    capacity = fyyur_app.metrics.capacity
+    assert capacity > 0
+    assert samples['fyyur_db_connections_max', ()] == 3 * capacity
+    samples = scraped(tmp_path, dead=pids)
+    assert samples['fyyur_db_connections_max', ()] == capacity
+    # the counters of dead workers stay counted
+    assert samples[requests] == 8
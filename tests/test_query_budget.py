@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import event
+from conftest import seed
+
+
+def statements(fyyur, path):
+    '''the statements a request for path runs'''
+    seen = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+    with fyyur.app.app_context():
+        engine = fyyur.db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = fyyur.app.test_client().get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return seen
+
+
+# every venue fits on one page, twice the venues is twice the rows on it
+@pytest.mark.parametrize('path', ['/venues', '/artists', '/shows', '/venues/1', '/artists/1'])
+def test_statements_do_not_grow_with_the_rows(fyyur_app, path):
+    seed(fyyur_app, 10)
+    few = statements(fyyur_app, path)
+    seed(fyyur_app, 20)
+    more = statements(fyyur_app, path)
+    assert len(more) == len(few), '\n\n'.join(more)
+
+def test_venues_is_one_statement(fyyur_app):
+    seed(fyyur_app, 20)
+    assert len(statements(fyyur_app, '/venues')) == 1
+
+def test_shows_runs_its_page_once(fyyur_app):
+    # the ETag stamp and the page share the page query
+    seed(fyyur_app, 20)
+    pages = [s for s in statements(fyyur_app, '/shows') if 'JOIN' in s.upper()]
+    assert len(pages) == 1, '\n\n'.join(pages)
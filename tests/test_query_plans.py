@@ -0,0 +1,10 @@
+from conftest import seed
+
+
+def test_hot_pages_use_their_indexes(fyyur_app):
+    seed(fyyur_app, 20)
+    with fyyur_app.app.app_context():
+        checks = fyyur_app.hot_queries(fyyur_app.Venue.query.get(1), fyyur_app.Artist.query.get(1))
+        fyyur_app.db.session.remove()
+        failures = fyyur_app.check_plans(fyyur_app.db.engine, fyyur_app.app.test_client(), checks)
+    assert failures == [], '\n'.join('{}: {}'.format(name, ' / '.join(plan)) for name, plan in failures)
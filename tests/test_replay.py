@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import logging
+import pytest
+from flask.logging import default_handler
+from conftest import seed
+
+# bench/ last, its dates.py must not hide the app's
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bench'))
+
+import replay
+
+
+@pytest.fixture
+def sampled(fyyur_app, monkeypatch, tmp_path):
+    '''every request of the test in the sample, returns the sample file'''
+    monkeypatch.setitem(fyyur_app.app.config, 'REQUEST_SAMPLE_FILE', str(tmp_path / 'requests.{worker}.jsonl'))
+    monkeypatch.setitem(fyyur_app.app.config, 'REQUEST_SAMPLE_RATE', 1.0)
+    app_logging = fyyur_app.app_logging
+    app_logging.start()
+    yield tmp_path / 'requests.main.jsonl'
+    app_logging.stop()
+    app_logging.logger.removeHandler(app_logging.handler)
+    requests = fyyur_app.app.logger.getChild('requests')
+    requests.setLevel(logging.NOTSET)
+    requests.propagate = True
+    app_logging.handler = app_logging.sample = None
+    app_logging.logger = fyyur_app.app.logger
+
+
+def test_sample_replays_its_args(fyyur_app, sampled):
+    seed(fyyur_app, 3)
+    client = fyyur_app.app.test_client()
+    paths = [
+        '/venues',
+        '/search?q=Venue&genre=Jazz&genre=Rock',
+        '/artists?page=1&per_page=2',
+    ]
+    for path in paths:
+        client.get(path)
+    client.post('/venues/search', data={'search_term': 'Venue'})
+    fyyur_app.app_logging.stop()
+
+    reads, writes = replay.load([str(sampled)])
+    assert writes == 1
+    assert [replay.url_of(entry) for entry in reads] == paths
+    assert reads[1]['args'] == {'q': 'Venue', 'genre': ['Jazz', 'Rock']}
+    # and what was written is what load() gives back
+    with open(sampled, encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert [entry for entry in lines if entry['method'] == 'GET'] == reads
+
+def test_sample_alone_keeps_requests_off_stderr(fyyur_app, sampled, monkeypatch):
+    written = []
+    monkeypatch.setattr(default_handler, 'emit', written.append)
+    fyyur_app.app.test_client().get('/')
+    fyyur_app.app.logger.error('not a request record')
+    fyyur_app.app_logging.stop()
+
+    # flask's handler still gets the app's own records
+    assert [record.getMessage() for record in written] == ['not a request record']
+    with open(sampled, encoding='utf-8') as f:
+        assert [json.loads(line)['path'] for line in f] == ['/']
@@ -0,0 +1,60 @@
+import pytest
+from conftest import venue_row
+
+
+@pytest.fixture
+def stand_ins(fyyur_app, monkeypatch):
+    '''
+    the same venue on the primary and the replica under two names, so a page
+    tells where it was read from. sqlite replicas never report lag: the
+    replica is a replica that has not replayed the last writes yet.
+    '''
+    monkeypatch.setitem(fyyur_app.app.config, 'REPLICA_MAX_LAG', 2)
+    with fyyur_app.app.app_context():
+        for bind, name in ((None, 'Primary Hall'), ('replica_0', 'Replica Hall')):
+            fyyur_app.db.get_engine(fyyur_app.app, bind=bind).execute(
+                fyyur_app.Venue.__table__.insert(), venue_row(1, name))
+    return fyyur_app
+
+def edit(client, name):
+    return client.post('/venues/1/edit', data=dict(venue_row(1, name), genres=['Jazz'], seeking_talent=''))
+
+
+def test_reads_go_to_the_replica(stand_ins):
+    client = stand_ins.app.test_client()
+    # a session, like the csrf token of a form the visitor opened
+    with client.session_transaction() as session:
+        session['csrf_token'] = 'token'
+    response = client.get('/venues/1')
+    assert b'Replica Hall' in response.data
+    assert b'Replica Hall' in client.get('/api/v1/venues/1').data
+    # nothing in the page depends on the session of a visitor who never wrote
+    assert 'Cookie' not in response.headers.get('Vary', '')
+
+def test_lagging_or_down_replicas_are_skipped(stand_ins, monkeypatch):
+    client = stand_ins.app.test_client()
+    for lag in (10.0, None):
+        monkeypatch.setattr(stand_ins.replicas, 'measure', lambda name: lag)
+        stand_ins.replicas.lags.clear()
+        stand_ins.page_cache.backend.clear()
+        assert b'Primary Hall' in client.get('/venues/1').data
+
+def test_writers_read_their_writes(stand_ins):
+    writer = stand_ins.app.test_client()
+    visitor = stand_ins.app.test_client()
+    # the edit form comes back (and its flashed message with it) once saved
+    assert edit(writer, 'Edited Hall').status_code == 200
+
+    # the visitor still reads the replica, which has not seen the edit
+    assert b'Replica Hall' in visitor.get('/venues/1').data
+    # the writer sticks to the primary, the page cache must not hand them
+    # the visitor's replica page
+    assert b'Edited Hall' in writer.get('/venues/1').data
+    assert b'Edited Hall' in writer.get('/venues').data
+
+def test_settled_replica_pages_are_cached(stand_ins, monkeypatch):
+    visitor = stand_ins.app.test_client()
+    assert b'Replica Hall' in visitor.get('/venues/1').data
+    # served from the cache: the replica is gone from the picture
+    monkeypatch.setattr(stand_ins.replicas, 'names', [])
+    assert b'Replica Hall' in visitor.get('/venues/1').data
@@ -0,0 +1,67 @@
+import datetime
+import pytest
+from conftest import seed, venue_row
+from search import TrigramIndex
+
+
+def names(fyyur, search, term):
+    with fyyur.app.app_context():
+        result = search.search(term, datetime.datetime.now(datetime.timezone.utc))
+        fyyur.db.session.remove()
+    assert result['count'] == len(result['data'])
+    return [row['name'] for row in result['data']]
+
+def add_venues(fyyur, *rows):
+    with fyyur.app.app_context():
+        for row in rows:
+            fyyur.db.session.add(fyyur.Venue(**row))
+        fyyur.db.session.commit()
+
+
+#  Name search
+#  ----------------------------------------------------------------
+
+def test_trigram_index_finds_substrings_best_match_first():
+    index = TrigramIndex()
+    for id, name in enumerate(['The Musical Hop', 'Park Square Live Music & Coffee', 'Hop Hall', 'Hopscotch'], 1):
+        index.add(id, name)
+    assert index.search('hop') == [3, 4, 1]
+    assert index.search('MUSIC') == [1, 2]
+    # shorter than a trigram, every name is a candidate
+    assert index.search('ho') == [3, 4, 1]
+    assert index.search('jazz') == []
+
+def test_name_search_without_pg_trgm(fyyur_app):
+    seed(fyyur_app, 12)
+    assert names(fyyur_app, fyyur_app.venue_search, 'venue 1') == ['Venue 1', 'Venue 10', 'Venue 11', 'Venue 12']
+    assert names(fyyur_app, fyyur_app.venue_search, 'ENUE 12') == ['Venue 12']
+    assert names(fyyur_app, fyyur_app.artist_search, 'artist 7') == ['Artist 7']
+    assert names(fyyur_app, fyyur_app.venue_search, 'nothing like it') == []
+
+@pytest.mark.parametrize('term, found', [('%', ['100% Jazz']), ('0% j', ['100% Jazz']), ('_', ['Under_score']),
+    ('r_s', ['Under_score']), ('e%', [])])
+def test_wildcards_match_themselves(fyyur_app, term, found):
+    add_venues(fyyur_app, venue_row(1, '100% Jazz'), venue_row(2, 'Under_score'), venue_row(3, 'Universe'))
+    assert names(fyyur_app, fyyur_app.venue_search, term) == found
+    # the same through the LIKE of the faceted search
+    with fyyur_app.app.app_context():
+        result = fyyur_app.facet_search['venues'].search(datetime.datetime.now(datetime.timezone.utc), term=term)
+    assert sorted(row['name'] for row in result['data']) == found
+
+def test_changes_invalidate_the_index(fyyur_app):
+    add_venues(fyyur_app, venue_row(1, 'Blue Note'))
+    assert names(fyyur_app, fyyur_app.venue_search, 'blue') == ['Blue Note']
+
+    add_venues(fyyur_app, venue_row(2, 'Blue Moon'))
+    assert names(fyyur_app, fyyur_app.venue_search, 'blue') == ['Blue Moon', 'Blue Note']
+
+    with fyyur_app.app.app_context():
+        fyyur_app.Venue.query.get(1).name = 'Green Note'
+        fyyur_app.db.session.commit()
+    assert names(fyyur_app, fyyur_app.venue_search, 'blue') == ['Blue Moon']
+
+    with fyyur_app.app.app_context():
+        fyyur_app.Venue.query.filter_by(id=2).delete()
+        fyyur_app.db.session.commit()
+    assert names(fyyur_app, fyyur_app.venue_search, 'blue') == []
+    assert names(fyyur_app, fyyur_app.venue_search, 'note') == ['Green Note']
@@ -0,0 +1,16 @@
+from conftest import seed
+
+
+def test_deleting_a_show_moves_its_pages_forward(fyyur_app):
+    seed(fyyur_app, 3)
+    with fyyur_app.app.app_context():
+        db = fyyur_app.db
+        show = fyyur_app.Show.query.order_by(fyyur_app.Show.updated_at.desc()).first()
+        venue_id, artist_id = show.venue_id, show.artist_id
+        before = fyyur_app.venue_stamp(venue_id)[1], fyyur_app.artist_stamp(artist_id)[1]
+        db.session.delete(show)
+        db.session.commit()
+        after = fyyur_app.venue_stamp(venue_id)[1], fyyur_app.artist_stamp(artist_id)[1]
+    # the newest show of both pages is gone, their Last-Modified must not go back
+    assert after[0] > before[0]
+    assert after[1] > before[1]
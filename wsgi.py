@@ -0,0 +1,35 @@
+"""
+Production entry point, served by gunicorn with the settings in
+gunicorn.conf.py:
+
+  gunicorn
+
+Importing it loads the app with the production profile and does the work
+every worker would otherwise repeat on its first requests: configuring the
+mappers and loading every template (from the bytecode cache when the build
+ran `flask compile-templates`). With preload_app that happens once in
+the master, and the forked workers share it.
+"""
+import os
+os.environ.setdefault('FYYUR_ENV', 'production')
+
+from sqlalchemy.orm import configure_mappers
+from app import app, db, app_logging
+
+
+def warm_up():
+    configure_mappers()
+    for name in app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html')):
+        app.jinja_env.get_template(name)
+
+
+def after_fork():
+    # a connection opened before the fork must not be shared by the workers
+    with app.app_context():
+        for bind in [None] + list(app.config['SQLALCHEMY_BINDS'] or ()):
+            db.get_engine(app, bind).dispose()
+    # the log writer thread stayed in the master
+    app_logging.after_fork()
+
+
+warm_up()